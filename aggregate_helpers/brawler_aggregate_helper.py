@@ -0,0 +1,301 @@
+import os
+import re
+import json
+import math
+import time
+import fcntl
+import threading
+from datetime import date
+from vertexairag_helpers.query_router import QueryRouter
+
+# Señales que el brief estructurado da por brawler (ver BrawlerMention)
+TIER_SCORES = {"S": 5, "A": 4, "B": 3, "C": 2, "D": 1, "F": 0}
+SENTIMENT_SCORES = {"positive": 1.0, "mixed": 0.0, "negative": -1.0}
+# Umbrales sobre el tier ponderado: A/S es fuerte, D/F es débil
+STRONG_TIER_SCORE = 3.5
+WEAK_TIER_SCORE = 1.5
+
+# Preguntas frecuentes que se pueden responder sin LLM. Cada patrón cubre la
+# pregunta completa ({b} es el brawler); cualquier otra forma va por RAG.
+BRAWLER_SLOT = r"(?P<b>[\w .&'-]+?)"
+RECENCY_SUFFIX = (
+    r"(\s+(right now|now|nowadays|currently|this season|in the (current )?meta|"
+    r"ahora|actualmente|esta temporada|en el meta( actual)?|agora|nessa temporada|no meta( atual)?))?"
+)
+STRENGTH_PATTERNS = [
+    r"(is|are) {b} (still |really )?(strong|good|op|meta|broken|viable|worth it)",
+    r"how (strong|good) is {b}",
+    r"{b} (strong|good|op|tier)",
+    r"(es|está) {b} (fuerte|buen[oa]|roto)",
+    r"{b} (es|está) (fuerte|buen[oa]|roto)",
+    r"qu[eé] tan (fuerte|buen[oa]) es {b}",
+    r"vale la pena {b}",
+    r"(o |a )?{b} (é|está) (forte|bom|boa)",
+]
+TIPS_PATTERNS = [
+    r"(any |some |best )?tips? (for|on|with) {b}",
+    r"{b} tips?",
+    r"how (do i|to|should i) play {b}",
+    r"(consejos?|tips?) (para|de|con) (jugar (con |a )?)?{b}",
+    r"c[oó]mo (se )?juega(r)? (con |a )?{b}",
+    r"(dicas?) (de|para|do|da|com) {b}",
+    r"como jogar (com |de )?{b}",
+]
+
+class BrawlerAggregateHelper:
+    """
+    Incrementally updated per-brawler view built from the ingested briefs.
+
+    For every brawler it keeps the mention count and the most recent mentions
+    (video_id, publish_date, sentiment, tier, tip), ordered by publish date.
+    Tier and sentiment come from the `tier` / `sentiment` fields of the brief
+    and are recency-weighted at lookup time with a half-life of
+    `half_life_days`. The verdict follows the tier; when the tier is unknown
+    or the sentiment contradicts it, strength questions go through RAG.
+
+    The view is a JSON file shared by the gunicorn workers through a file
+    lock or, with backend="gcs" (default: same as CHECKPOINT_BACKEND), one
+    object per video under `brawler_aggregates/` in the project bucket, so it
+    survives restarts and is shared by every Cloud Run instance.
+    """
+
+    path = os.getenv("BRAWLER_AGGREGATES_PATH", "/tmp/brawler_aggregates.json")
+    backend = os.getenv("BRAWLER_AGGREGATES_BACKEND", os.getenv("CHECKPOINT_BACKEND", "local"))
+    gcs_prefix = "brawler_aggregates"
+    refresh_seconds = float(os.getenv("BRAWLER_AGGREGATES_REFRESH_SECONDS", "60"))
+    half_life_days = float(os.getenv("BRAWLER_AGGREGATES_HALF_LIFE_DAYS", "30"))
+    max_mentions = int(os.getenv("BRAWLER_AGGREGATES_MAX_MENTIONS", "50"))
+
+    def __init__(self, path: str = None, query_router: QueryRouter = None, backend: str = None) -> None:
+        self.path = path or self.path
+        self.backend = backend or self.backend
+        self.query_router = query_router or QueryRouter()
+        self._lock = threading.Lock()
+        self._data = {"videos": [], "brawlers": {}}
+        self._mtime = None
+        self._refreshed_at = 0.0
+        self._intents = [
+            (intent, re.compile(p.format(b=BRAWLER_SLOT) + RECENCY_SUFFIX, re.IGNORECASE))
+            for intent, patterns in (("tips", TIPS_PATTERNS), ("strength", STRENGTH_PATTERNS))
+            for p in patterns
+        ]
+
+        if self.backend == "gcs":
+            from gcs_helpers.gcs_helper import GCSHelper
+            self.gcs_helper = GCSHelper()
+        self._reload()
+
+    def add_video(self, video_id: str, publish_date: str, brief: dict) -> bool:
+        """
+        Fold the brawlers_mentioned of a brief into the aggregate view.
+
+        Args:
+            video_id (str): The YouTube video id.
+            publish_date (str): Publish date (YYYY-MM-DD).
+            brief (dict): TranscriptAnalysisResult of the video.
+
+        Returns:
+            bool: False if the video was already aggregated.
+        """
+        mentions = [
+            {
+                "name": b["name"],
+                "sentiment": SENTIMENT_SCORES.get((b.get("sentiment") or "").strip().lower()),
+                "tier": self._tier(b.get("tier")),
+                "tip": b.get("relevant_tips_or_strategies") or "",
+            }
+            for b in brief.get("brawlers_mentioned", [])
+        ]
+        video = {"video_id": video_id, "publish_date": publish_date, "mentions": mentions}
+
+        if self.backend == "gcs":
+            with self._lock:
+                if video_id in self._data["videos"]:
+                    return False
+                self.gcs_helper.upload_string(json.dumps(video), f"{self.gcs_prefix}/{video_id}.json")
+                self._fold(video)
+                return True
+
+        with self._lock, open(f"{self.path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Relee por si otro worker actualizó el archivo
+                self._reload(force=True)
+                if video_id in self._data["videos"]:
+                    return False
+                self._fold(video)
+                self._write()
+                return True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def lookup(self, brawler: str, since: str = None, today: date = None) -> dict | None:
+        """
+        Aggregated signals for a brawler.
+
+        Args:
+            brawler (str): Official brawler name.
+            since (str, optional): Only mentions published on or after this date.
+            today (date, optional): Reference date for the recency weighting.
+
+        Returns:
+            dict: Mention count, weighted sentiment/tier, verdict, recent tips
+            and source videos, or None if the brawler has no mentions.
+            The verdict is "strong", "mixed" or "weak" from the tier score,
+            "conflicting" if the sentiment contradicts the tier, or None
+            without a tier signal.
+        """
+        with self._lock:
+            self._reload()
+            entry = self._data["brawlers"].get(brawler)
+            if entry is None:
+                return None
+            mentions = [m for m in entry["mentions"] if not since or (m["publish_date"] or "") >= since]
+        if not mentions:
+            return None
+
+        today = today or date.today()
+        sentiment = self._weighted(mentions, "sentiment", today)
+        tier_score = self._weighted(mentions, "tier", today)
+
+        verdict = None
+        if tier_score is not None:
+            if tier_score >= STRONG_TIER_SCORE:
+                verdict = "strong"
+            elif tier_score <= WEAK_TIER_SCORE:
+                verdict = "weak"
+            else:
+                verdict = "mixed"
+            # La opinión del creador contradice el tier: mejor responder con RAG
+            if sentiment is not None and (
+                (verdict == "strong" and sentiment < -0.2) or (verdict == "weak" and sentiment > 0.2)
+            ):
+                verdict = "conflicting"
+
+        return {
+            "brawler": brawler,
+            "mentions_count": len(mentions) if since else entry["mentions_count"],
+            "sentiment": sentiment,
+            "tier_score": tier_score,
+            "verdict": verdict,
+            "recent_tips": [m["tip"] for m in mentions if m["tip"]][:3],
+            "sources": [{"video_id": m["video_id"], "publish_date": m["publish_date"]} for m in mentions[:5]],
+        }
+
+    def answer(self, query: str, today: date = None) -> dict | None:
+        """
+        Answer a common per-brawler question from the aggregate view.
+
+        Only whole questions of a known form about a single brawler ("is X
+        strong/good/op", "how good is X", "tips for X", "how to play X", and
+        their Spanish / Portuguese forms, optionally ending in "right now" /
+        "in the current meta") are answered here.
+
+        Args:
+            query (str): The user query.
+            today (date, optional): Reference date for recency windows.
+
+        Returns:
+            dict: The answer, or None if the question is open-ended or the
+            aggregate has no reliable answer, and it must go through RAG.
+        """
+        matched = self._match_intent(query)
+        if matched is None:
+            return None
+        intent, brawler = matched
+
+        route = self.query_router.route(query, today=today)
+        stats = self.lookup(brawler, since=route["since_date"] or None, today=today)
+        if stats is None:
+            return None
+
+        name = stats["brawler"]
+        if intent == "tips":
+            if not stats["recent_tips"]:
+                return None
+            text = "Tips for " + name + ": " + " | ".join(stats["recent_tips"])
+        else:
+            if stats["verdict"] in (None, "conflicting"):
+                return None
+            text = (
+                f"{name} is rated {stats['verdict']} across {stats['mentions_count']} recent mentions "
+                f"(tier score {stats['tier_score']}/5)."
+            )
+        return {"answer": text, "intent": intent, **stats}
+
+    # --- Helpers privados ---
+    def _match_intent(self, query: str) -> tuple[str, str] | None:
+        # La pregunta entera tiene que ser una forma común sobre un solo brawler
+        text = " ".join(query.split()).strip("¿¡?!. ")
+        for intent, pattern in self._intents:
+            match = pattern.fullmatch(text)
+            if match is None:
+                continue
+            brawlers = self.query_router.find_brawlers(match.group("b"))
+            if len(brawlers) == 1 and self.query_router.find_brawlers(text) == brawlers:
+                return intent, brawlers[0]
+        return None
+
+    @staticmethod
+    def _tier(value: str | None) -> int | None:
+        # Acepta "S", "s", "S tier", "S-tier"
+        match = re.fullmatch(r"\s*([SABCDF])(?:[\s-]*tier)?\s*", value or "", re.IGNORECASE)
+        return TIER_SCORES[match.group(1).upper()] if match else None
+
+    def _weighted(self, mentions: list, field: str, today: date) -> float | None:
+        total, weight = 0.0, 0.0
+        for m in mentions:
+            if m.get(field) is None:
+                continue
+            age = (today - date.fromisoformat(m["publish_date"])).days if m["publish_date"] else 365
+            w = math.pow(0.5, max(age, 0) / self.half_life_days)
+            total += w * m[field]
+            weight += w
+        return round(total / weight, 2) if weight else None
+
+    def _fold(self, video: dict) -> None:
+        if video["video_id"] in self._data["videos"]:
+            return
+        for m in video["mentions"]:
+            entry = self._data["brawlers"].setdefault(m["name"], {"mentions_count": 0, "mentions": []})
+            entry["mentions_count"] += 1
+            entry["mentions"].append({
+                "video_id": video["video_id"],
+                "publish_date": video["publish_date"],
+                "sentiment": m["sentiment"],
+                "tier": m["tier"],
+                "tip": m["tip"],
+            })
+            entry["mentions"].sort(key=lambda x: x["publish_date"] or "", reverse=True)
+            del entry["mentions"][self.max_mentions:]
+        self._data["videos"].append(video["video_id"])
+
+    def _reload(self, force: bool = False) -> None:
+        if self.backend == "gcs":
+            # Lista los videos nuevos de otras instancias como mucho cada refresh_seconds
+            if not force and time.time() - self._refreshed_at < self.refresh_seconds:
+                return
+            for name in self.gcs_helper.list_files(prefix=f"{self.gcs_prefix}/"):
+                vid = name[len(self.gcs_prefix) + 1:].removesuffix(".json")
+                if vid not in self._data["videos"]:
+                    raw = self.gcs_helper.download_string(name)
+                    if raw:
+                        self._fold(json.loads(raw))
+            self._refreshed_at = time.time()
+            return
+
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if force or mtime != self._mtime:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+            self._mtime = mtime
+
+    def _write(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
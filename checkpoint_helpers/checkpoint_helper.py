@@ -0,0 +1,133 @@
+import os
+import json
+from datetime import datetime, timezone
+
+
+class CheckpointHelper:
+    """
+    Durable per-video checkpoints for the ingestion pipeline.
+
+    A checkpoint is a JSON document keyed by (video_id, pipeline_version) that
+    stores the output of every completed stage, so a retry resumes from the
+    last completed stage instead of repeating the transcript fetch and the
+    LLM call. Checkpoints are stored in a local directory or, with
+    backend="gcs", under `checkpoints/` in the project bucket so they survive
+    instance restarts and deploys.
+    """
+
+    backend = os.getenv("CHECKPOINT_BACKEND", "local")
+    local_dir = os.getenv("CHECKPOINT_DIR", "/tmp/checkpoints")
+    gcs_prefix = "checkpoints"
+
+    def __init__(self, pipeline_version: str, backend: str = None, local_dir: str = None) -> None:
+        self.pipeline_version = pipeline_version
+        self.backend = backend or self.backend
+        self.local_dir = os.path.join(local_dir or self.local_dir, pipeline_version)
+
+        if self.backend == "gcs":
+            from gcs_helpers.gcs_helper import GCSHelper
+            self.gcs_helper = GCSHelper()
+        else:
+            os.makedirs(self.local_dir, exist_ok=True)
+
+    def new(self, video_id: str, url: str) -> dict:
+        """ Empty checkpoint for a video that has not started yet. """
+        return {
+            "video_id": video_id,
+            "url": url,
+            "pipeline_version": self.pipeline_version,
+            "stages": {},
+            "completed": False,
+            "updated_at": None,
+        }
+
+    def load(self, video_id: str) -> dict | None:
+        """
+        Load the checkpoint of a video.
+
+        Args:
+            video_id (str): The YouTube video id.
+
+        Returns:
+            dict: The checkpoint, or None if the video has no checkpoint.
+        """
+        raw = self._read(self._key(video_id))
+        return json.loads(raw) if raw else None
+
+    def save_stage(self, checkpoint: dict, stage: str, data) -> dict:
+        """
+        Record the output of a completed stage and persist the checkpoint.
+
+        Args:
+            checkpoint (dict): Checkpoint returned by `new` or `load`.
+            stage (str): Stage name (e.g. "transcript", "brief").
+            data: JSON serializable output of the stage.
+
+        Returns:
+            dict: The updated checkpoint.
+        """
+        checkpoint["stages"][stage] = data
+        return self._save(checkpoint)
+
+    def clear_stages(self, checkpoint: dict, *stages: str) -> dict:
+        """ Drop stages so the next run repeats them, and mark the checkpoint incomplete. """
+        for stage in stages:
+            checkpoint["stages"].pop(stage, None)
+        checkpoint["completed"] = False
+        return self._save(checkpoint)
+
+    def mark_completed(self, checkpoint: dict) -> dict:
+        checkpoint["completed"] = True
+        return self._save(checkpoint)
+
+    def list_incomplete(self) -> list[dict]:
+        """ Checkpoints of this pipeline version that did not reach the last stage. """
+        incomplete = []
+        for key in self._list_keys():
+            raw = self._read(key)
+            if not raw:
+                continue
+            checkpoint = json.loads(raw)
+            if not checkpoint.get("completed"):
+                incomplete.append(checkpoint)
+        return incomplete
+
+    # --- Helpers privados ---
+    def _save(self, checkpoint: dict) -> dict:
+        checkpoint["updated_at"] = datetime.now(timezone.utc).isoformat()
+        self._write(self._key(checkpoint["video_id"]), json.dumps(checkpoint))
+        return checkpoint
+
+    def _key(self, video_id: str) -> str:
+        if self.backend == "gcs":
+            return f"{self.gcs_prefix}/{self.pipeline_version}/{video_id}.json"
+        return os.path.join(self.local_dir, f"{video_id}.json")
+
+    def _list_keys(self) -> list[str]:
+        if self.backend == "gcs":
+            return [
+                name for name in self.gcs_helper.list_files(prefix=f"{self.gcs_prefix}/{self.pipeline_version}/")
+                if name.endswith(".json")
+            ]
+        return [
+            os.path.join(self.local_dir, name)
+            for name in sorted(os.listdir(self.local_dir)) if name.endswith(".json")
+        ]
+
+    def _read(self, key: str) -> str | None:
+        if self.backend == "gcs":
+            return self.gcs_helper.download_string(key)
+        if not os.path.exists(key):
+            return None
+        with open(key, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _write(self, key: str, data: str) -> None:
+        if self.backend == "gcs":
+            self.gcs_helper.upload_string(data, key)
+            return
+        # Escritura atómica para no dejar checkpoints a medio escribir
+        tmp_path = f"{key}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, key)
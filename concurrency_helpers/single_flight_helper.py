@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import threading
+from typing import Any, Callable
+
+
+class _Call:
+    """ In-flight execution shared by every caller waiting on the same key. """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlightHelper:
+    """
+    Coalesces concurrent executions for the same key.
+
+    The first caller for a key runs the function; every other caller that
+    arrives while it is running waits and receives the same result (or error).
+    If `lock_dir` is set, a file lock per key also covers the other gunicorn
+    workers: the result is written next to the lock and reused by callers in
+    other processes for `result_ttl` seconds. Lock and result files are named
+    by the sha256 of the key, so keys never reach the filesystem as paths.
+    """
+
+    def __init__(self, lock_dir: str | None = None, result_ttl: float = 300.0) -> None:
+        self.lock_dir = lock_dir
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """
+        Run `fn` once for all concurrent callers of `key`.
+
+        Args:
+            key (str): Deduplication key (e.g. the video_id).
+            fn (Callable): Function to execute, without arguments.
+
+        Returns:
+            tuple: (result, shared) where `shared` is True if the result
+            came from another caller's execution.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, shared = self._run(key, fn)
+            return call.result, shared
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self) -> list[str]:
+        """ Keys currently being executed in this process. """
+        with self._lock:
+            return list(self._calls.keys())
+
+    # --- Helpers privados ---
+    def _run(self, key: str, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        if not self.lock_dir:
+            return fn(), False
+
+        # Hash de la key: nunca se usa texto del usuario como nombre de archivo
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        lock_path = os.path.join(self.lock_dir, f"{name}.lock")
+        result_path = os.path.join(self.lock_dir, f"{name}.json")
+        with open(lock_path, "w") as lock_file:
+            # Bloquea hasta que el worker que tiene el lock termine
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                cached = self._read_result(result_path)
+                if cached is not None:
+                    return cached, True
+                result = fn()
+                self._write_result(result_path, result)
+                return result, False
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_result(self, path: str) -> Any | None:
+        try:
+            if time.time() - os.path.getmtime(path) > self.result_ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_result(self, path: str, result: Any) -> None:
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError):
+            # Resultados no serializables solo se comparten dentro del proceso
+            pass
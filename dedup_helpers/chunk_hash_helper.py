@@ -0,0 +1,78 @@
+import os
+import hashlib
+
+
+class ChunkHashIndex:
+    """
+    Hashes of the chunk texts already imported into each corpus partition.
+
+    RAG Engine embeds every imported file itself, so a chunk whose text is
+    already in the partition (a re-upload that reuses the original brief,
+    a global chunk repeated across videos) would be embedded again. The
+    pipeline drops those chunks before the upload and records the hashes
+    of the imported ones afterwards.
+
+    Each hash is an empty marker `<partition>/<sha256>` under `local_dir` or,
+    with backend="gcs" (default: same as CHECKPOINT_BACKEND), under
+    `chunk_hashes/` in the project bucket, so every instance sees the same
+    index. A partition has a single embedding model, so the partition and
+    the text hash identify the embedding.
+    """
+
+    backend = os.getenv("CHUNK_HASH_BACKEND", os.getenv("CHECKPOINT_BACKEND", "local"))
+    local_dir = os.getenv("CHUNK_HASH_DIR", "/tmp/chunk_hashes")
+    gcs_prefix = "chunk_hashes"
+
+    def __init__(self, backend: str = None, local_dir: str = None) -> None:
+        self.backend = backend or self.backend
+        self.local_dir = local_dir or self.local_dir
+
+        if self.backend == "gcs":
+            from gcs_helpers.gcs_helper import GCSHelper
+            self.gcs_helper = GCSHelper()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """ SHA-256 of the whitespace-normalized chunk text. """
+        return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+    def new_chunks(self, partition: str, chunks: list) -> list:
+        """
+        Chunks whose text is not yet imported into the partition.
+
+        Args:
+            partition (str): Corpus partition display name.
+            chunks (list): Chunks from `utils.process_video_dict`.
+
+        Returns:
+            list: The chunks to import, without repeated texts.
+        """
+        seen, fresh = set(), []
+        for chunk in chunks:
+            digest = self.text_hash(chunk["text"])
+            if digest in seen or self._exists(self._key(partition, digest)):
+                continue
+            seen.add(digest)
+            fresh.append(chunk)
+        return fresh
+
+    def mark_imported(self, partition: str, chunks: list) -> None:
+        """ Record the texts of chunks whose import into the partition finished. """
+        for chunk in chunks:
+            key = self._key(partition, self.text_hash(chunk["text"]))
+            if self.backend == "gcs":
+                self.gcs_helper.create_if_absent(key, "")
+                continue
+            os.makedirs(os.path.dirname(key), exist_ok=True)
+            open(key, "a").close()
+
+    # --- Helpers privados ---
+    def _key(self, partition: str, digest: str) -> str:
+        if self.backend == "gcs":
+            return f"{self.gcs_prefix}/{partition}/{digest}"
+        return os.path.join(self.local_dir, partition, digest)
+
+    def _exists(self, key: str) -> bool:
+        if self.backend == "gcs":
+            return self.gcs_helper.file_exists(key)
+        return os.path.exists(key)
@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import time
+import fcntl
+import hashlib
+import threading
+from collections import Counter
+
+
+class ContainmentIndex:
+    """
+    Near-duplicate detection by containment over sampled transcript shingles.
+
+    Detects transcripts that are (mostly) contained in an already ingested one:
+    re-uploads, Shorts and clips. Jaccard similarity is symmetric, so a short
+    excerpt of a long video always scores low; containment |A∩B| / |A| of the
+    new transcript A in an ingested one B does not.
+
+    Each transcript is reduced to a sketch: the hashes of its word k-grams
+    that fall in a fixed 1/`sample_rate` slice of the hash space. The slice
+    is the same for every transcript, so a shingle shared by A and B is kept
+    in both sketches and |sketch(A) ∩ sketch(B)| / |sketch(A)| estimates the
+    containment. Lookups go through an inverted index sketch hash -> videos,
+    one dict access per hash of the new transcript.
+
+    Entries are appended to a JSONL log at `path` (local or on a shared
+    filesystem) or, with backend="gcs", written as one object per video under
+    `dedup_index/` in the project bucket, so every worker and Cloud Run
+    instance sees the same index. Entries added by other processes are loaded
+    before a query (from GCS at most every `refresh_seconds`).
+    """
+
+    sample_rate = int(os.getenv("DEDUP_SAMPLE_RATE", "8"))
+    min_samples = int(os.getenv("DEDUP_MIN_SAMPLES", "5"))
+    shingle_size = int(os.getenv("DEDUP_SHINGLE_SIZE", "5"))
+    threshold = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+    path = os.getenv("DEDUP_INDEX_PATH", "/tmp/dedup_index.jsonl")
+    backend = os.getenv("DEDUP_INDEX_BACKEND", "local")
+    gcs_prefix = "dedup_index"
+    refresh_seconds = float(os.getenv("DEDUP_REFRESH_SECONDS", "60"))
+
+    def __init__(self, path: str = None, threshold: float = None, sample_rate: int = None,
+                 backend: str = None) -> None:
+        self.path = path if path is not None else self.path
+        self.backend = backend or self.backend
+        self.threshold = threshold if threshold is not None else self.threshold
+        self.sample_rate = sample_rate or self.sample_rate
+
+        self._lock = threading.Lock()
+        self._sketches: dict[str, int] = {}
+        self._meta: dict[str, dict] = {}
+        self._postings: dict[int, list[str]] = {}
+        self.tokens_saved = 0
+        # Bytes del log local ya leídos (se relee solo lo agregado después)
+        self._offset = 0
+        self._refreshed_at = 0.0
+
+        if self.backend == "gcs":
+            from gcs_helpers.gcs_helper import GCSHelper
+            self.gcs_helper = GCSHelper()
+        self._reload(force=True)
+
+    def shingles(self, text: str) -> set[str]:
+        """ Word k-grams of the normalized transcript. """
+        words = re.findall(r"\w+", text.lower())
+        k = self.shingle_size
+        if len(words) < k:
+            return {" ".join(words)} if words else set()
+        return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+    def signature(self, text: str) -> list[int]:
+        """
+        Sketch of a transcript: its sampled shingle hashes.
+
+        Args:
+            text (str): Transcript text (as returned by YouTubeHelper.get_transcript).
+
+        Returns:
+            list: Sorted shingle hashes, or an empty list if the transcript
+            is too short to sample `min_samples` hashes (such transcripts
+            are never matched nor indexed).
+        """
+        hashes = {
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+            for s in self.shingles(text)
+        }
+        sketch = sorted(h for h in hashes if h % self.sample_rate == 0)
+        return sketch if len(sketch) >= self.min_samples else []
+
+    def query(self, signature: list[int], exclude: str = None) -> dict | None:
+        """
+        Find the ingested video that best contains the transcript.
+
+        Args:
+            signature (list): Sketch from `signature()`.
+            exclude (str, optional): video_id to ignore (the video itself).
+
+        Returns:
+            dict: {"video_id", "similarity" (containment), **metadata} or None.
+        """
+        if not signature:
+            return None
+        with self._lock:
+            # Carga lo que agregaron otros workers / instancias desde la última lectura
+            self._reload()
+            hits = Counter()
+            for h in signature:
+                hits.update(self._postings.get(h, ()))
+            hits.pop(exclude, None)
+            if not hits:
+                return None
+            vid, shared = hits.most_common(1)[0]
+            score = shared / len(signature)
+            if score < self.threshold:
+                return None
+            return {"video_id": vid, "similarity": round(score, 3), **self._meta[vid]}
+
+    def add(self, video_id: str, signature: list[int], **metadata) -> None:
+        """
+        Add an ingested video to the index and persist it.
+
+        Args:
+            video_id (str): The YouTube video id.
+            signature (list): Sketch from `signature()`.
+            **metadata: Extra data returned by `query` (e.g. llm_tokens).
+        """
+        if not signature:
+            return
+        entry = {"video_id": video_id, "sketch": signature, "meta": metadata}
+        with self._lock:
+            self._insert(entry)
+            if self.backend == "gcs":
+                self.gcs_helper.upload_string(json.dumps(entry), f"{self.gcs_prefix}/{video_id}.json")
+            elif self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    # Lock para que las líneas de varios workers no se intercalen
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        f.write(json.dumps(entry) + "\n")
+                    finally:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def record_saved(self, tokens: int) -> int:
+        """ Accumulate LLM tokens saved by skipping or reusing an analysis. """
+        with self._lock:
+            self.tokens_saved += tokens
+            return self.tokens_saved
+
+    def __len__(self) -> int:
+        return len(self._sketches)
+
+    # --- Helpers privados ---
+    def _insert(self, entry: dict) -> None:
+        vid = entry["video_id"]
+        if vid in self._sketches:
+            return
+        self._sketches[vid] = len(entry["sketch"])
+        self._meta[vid] = entry.get("meta", {})
+        for h in entry["sketch"]:
+            self._postings.setdefault(h, []).append(vid)
+
+    def _reload(self, force: bool = False) -> None:
+        if self.backend == "gcs":
+            # Lista los videos nuevos de otras instancias como mucho cada refresh_seconds
+            if not force and time.time() - self._refreshed_at < self.refresh_seconds:
+                return
+            for name in self.gcs_helper.list_files(prefix=f"{self.gcs_prefix}/"):
+                vid = name[len(self.gcs_prefix) + 1:].removesuffix(".json")
+                if vid not in self._sketches:
+                    raw = self.gcs_helper.download_string(name)
+                    if raw:
+                        self._insert_valid(json.loads(raw))
+            self._refreshed_at = time.time()
+            return
+
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Solo líneas completas: una línea a medio escribir se lee la próxima vez
+        complete = data[:data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        for line in complete.decode("utf-8").splitlines():
+            if line.strip():
+                self._insert_valid(json.loads(line))
+
+    def _insert_valid(self, entry: dict) -> None:
+        # Las entradas con firmas MinHash de versiones anteriores no son comparables
+        if entry.get("sketch"):
+            self._insert(entry)
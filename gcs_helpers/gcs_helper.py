@@ -1,5 +1,7 @@
 import os
+from datetime import datetime, timezone
 from google.cloud import storage
+from google.api_core.exceptions import NotFound, PreconditionFailed
 
 class GCSHelper:
     def __init__(self):
@@ -31,6 +33,66 @@ class GCSHelper:
         blob.upload_from_filename(local_path)
         return f"gs://{self.bucket_name}/{remote_path}"
 
+    def upload_string(self, data: str, remote_path: str, content_type: str = "application/json") -> str:
+        """
+        Upload a string as a file to the GCS bucket.
+
+        Args:
+            data (str): Content to upload.
+            remote_path (str): Path in the GCS bucket.
+            content_type (str): Content type of the object.
+
+        Returns:
+            str: GCS path of the uploaded file.
+        """
+        blob = self.bucket.blob(remote_path)
+        blob.upload_from_string(data, content_type=content_type)
+        return f"gs://{self.bucket_name}/{remote_path}"
+
+    def download_string(self, remote_path: str) -> str | None:
+        """ Download a file from the GCS bucket as text, or None if it does not exist. """
+        blob = self.bucket.blob(remote_path)
+        if not blob.exists():
+            return None
+        return blob.download_as_text()
+
+    def create_if_absent(self, remote_path: str, data: str) -> bool:
+        """
+        Create a file only if it does not exist yet (atomic across processes).
+
+        Args:
+            remote_path (str): Path in the GCS bucket.
+            data (str): Content to upload.
+
+        Returns:
+            bool: True if this call created the file, False if it already existed.
+        """
+        blob = self.bucket.blob(remote_path)
+        try:
+            blob.upload_from_string(data, content_type="text/plain", if_generation_match=0)
+        except PreconditionFailed:
+            return False
+        return True
+
+    def delete_if_older(self, remote_path: str, seconds: float) -> bool:
+        """ Delete a file created more than `seconds` ago. Returns True if it was deleted. """
+        blob = self.bucket.get_blob(remote_path)
+        if blob is None or (datetime.now(timezone.utc) - blob.time_created).total_seconds() < seconds:
+            return False
+        try:
+            # Solo la generación leída: no borra un archivo recreado por otro proceso
+            blob.delete(if_generation_match=blob.generation)
+        except (NotFound, PreconditionFailed):
+            return False
+        return True
+
+    def delete_prefix(self, prefix: str) -> int:
+        """ Delete every file under a prefix. Returns the number of deleted files. """
+        blobs = list(self.bucket.list_blobs(prefix=prefix))
+        for blob in blobs:
+            blob.delete()
+        return len(blobs)
+
     def file_exists(self, remote_path: str) -> bool:
         return self.bucket.blob(remote_path).exists()
 
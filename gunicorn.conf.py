@@ -0,0 +1,7 @@
+# Configuración leída automáticamente por gunicorn desde el directorio de trabajo
+
+
+def worker_exit(server, worker):
+    # Envía los spans pendientes de Langfuse antes de que el worker termine
+    from tracing_helpers import tracing_helper
+    tracing_helper.shutdown()
@@ -98,4 +98,40 @@ BRAWLERS_LIST = [
 
 
 def get_brawlers_list() -> str:
-    return ", ".join(BRAWLERS_LIST)
\ No newline at end of file
+    return ", ".join(BRAWLERS_LIST)
+
+# Common alternative spellings (transcription errors, nicknames, Spanish names)
+# mapped to the official name in BRAWLERS_LIST. Aliases that are also everyday
+# words ("primo" is "cousin" in Spanish, "mike", "ali") are left out on purpose.
+BRAWLER_ALIASES = {
+    "8bit": "8-Bit",
+    "8 bit": "8-Bit",
+    "jesse": "Jessie",
+    "dyna": "Dynamike",
+    "larry": "Larry & Lawrie",
+    "lawrie": "Larry & Lawrie",
+    "larry and lawrie": "Larry & Lawrie",
+    "mr p": "Mr. P",
+    "mister p": "Mr. P",
+    "rt": "R-T",
+    "jae yong": "Jae-yong",
+    "jaeyong": "Jae-yong",
+    "cordi": "Cordelius",
+    "melody": "Melodie",
+    "colete": "Colette",
+    "collette": "Colette",
+    "daryl": "Darryl",
+    "emmz": "Emz",
+    "squeek": "Squeak",
+}
+
+# Official names that are also common words in English, Spanish or Portuguese
+# ("max level", "a spike in damage", "rico", "rosa"). They only count as a
+# brawler mention when capitalised or next to game context (see QueryRouter);
+# their aliases above ("squeek") always count.
+AMBIGUOUS_BRAWLER_NAMES = {
+    "Ash", "Belle", "Berry", "Bo", "Bull", "Buster", "Buzz", "Chuck", "Colt", "Crow",
+    "Eve", "Fang", "Frank", "Gale", "Gene", "Gray", "Kit", "Leon", "Lily", "Max",
+    "Mico", "Pearl", "Penny", "Piper", "Rico", "Rosa", "Sandy", "Shade", "Spike",
+    "Sprout", "Squeak", "Surge", "Tick", "Trunk", "Willow",
+}
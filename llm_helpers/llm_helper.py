@@ -1,13 +1,16 @@
 import os
-import re
+import math
+import time
+import threading
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
-from llm_helpers import prompts
+from llm_helpers.prompt_registry import registry
 from langchain_community.callbacks.manager import get_openai_callback
 from langchain_community.callbacks.manager import OpenAICallbackHandler
 from .schemas import TranscriptAnalysisResult
-from langchain_core.prompts import ChatPromptTemplate
+from vertexairag_helpers.query_router import QueryRouter
+import utils
 
 load_dotenv()
 
@@ -18,54 +21,70 @@ class LlmHelper:
         self.model_name = os.getenv("OPENAI_MODEL_NAME", "gpt-3.5-turbo")
         self.max_tokens = int(os.getenv("OPENAI_MAX_TOKENS", "512"))
         self.temperature = float(os.getenv("OPENAI_TEMPERATURE", "0.7"))
+        # Tokens de salida medidos en test/llm_response.txt: ~50 por brawler más tier y
+        # sentiment, ~220 de summary, key_topics y meta_notes
+        self.tokens_per_brawler = int(os.getenv("LLM_TOKENS_PER_BRAWLER", "65"))
+        self.base_output_tokens = int(os.getenv("LLM_BASE_OUTPUT_TOKENS", "230"))
+        # Brawlers que entran en la salida de una llamada (por defecto según OPENAI_MAX_TOKENS);
+        # con más se extrae por partes (0 = nunca)
+        self.shard_brawlers = int(os.getenv(
+            "LLM_SHARD_BRAWLERS",
+            max(1, (self.max_tokens - self.base_output_tokens) // self.tokens_per_brawler)
+        ))
+        self.shard_concurrency = int(os.getenv("LLM_SHARD_CONCURRENCY", "8"))
+        self.shard_overlap = 200
+        # Veces que una parte truncada se vuelve a dividir antes de fallar
+        self.max_resplits = 3
 
         if not self.api_key:
             raise ValueError("Falta la variable OPENAI_API_KEY en .env")
 
+        # Opcional: agrupa los requests en el mismo caché de prompts del proveedor
+        prompt_cache_key = os.getenv("OPENAI_PROMPT_CACHE_KEY")
+
         # Inicializa el cliente de langchain
         self.llm = ChatOpenAI(
             openai_api_key=self.api_key,
             model_name=self.model_name,
             temperature=self.temperature,
             max_completion_tokens=self.max_tokens,
+            extra_body={"prompt_cache_key": prompt_cache_key} if prompt_cache_key else None,
         )
 
         # Configura el LLM para usar salida estructurada
         # Esto permite que el LLM devuelva un objeto TranscriptAnalysisResult en lugar de un string
         self.structured_llm = self.llm.with_structured_output(TranscriptAnalysisResult)
+        # Igual, pero con el mensaje crudo para ver si la salida se truncó (finish_reason)
+        self.structured_llm_raw = self.llm.with_structured_output(TranscriptAnalysisResult, include_raw=True)
+        self.brawler_finder = QueryRouter()
+
+        # Uso acumulado, incluye los tokens de prompt servidos desde el caché del proveedor
+        self._usage_lock = threading.Lock()
+        self.usage = {"calls": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0, "seconds": 0.0}
 
 
     def load_prompt_template(self, prompt_name: str, **kwargs) -> PromptTemplate:
         """
         Loads a prompt template by variable name from prompts.py.
     
-        - Scans for all placeholders inside `{}`.
-        - Builds a PromptTemplate dynamically.
+        - The template is compiled and its placeholders detected only once
+          (see PromptRegistry).
+        - Split prompts (NAME_PREFIX / NAME_SUFFIX) become a stable system
+          message followed by the variable user message, so the provider can
+          reuse its prompt cache for the prefix.
         - If kwargs are provided, fills the placeholders.
         
         Example:
         _load_prompt("YOUTUBE_VIDEO_BRIEF", transcript="...", title="...")
 
         """
-        if not hasattr(prompts, prompt_name):
-            raise ValueError(f"Prompt variable '{prompt_name}' not found in prompts folder")
-
-        template_str = getattr(prompts, prompt_name)
+        compiled = registry.get(prompt_name)
 
-        chat_prompt_template = ChatPromptTemplate.from_messages([
-            ("system", template_str)
-        ])
-
-        # Si pasan kwargs, valida y embebe con partial()
+        # Si pasan kwargs, valida contra los placeholders ya detectados
         if kwargs:
-            # Detect placeholders inside the template (anything inside { })
-            placeholders = [v.strip() for v in re.findall(r"{(.*?)}", template_str)]
-            missing = [v for v in placeholders if v not in kwargs]
-            if missing:
-                raise ValueError(f"Missing placeholders: {missing}")
-            chat_prompt_template = chat_prompt_template.partial(**kwargs)
+            compiled.validate(kwargs)
 
-        return chat_prompt_template.format_messages()
+        return compiled.template.format_messages(**kwargs)
 
 
     def run(self, prompt: str) -> tuple[str, OpenAICallbackHandler]:
@@ -74,7 +93,84 @@ class LlmHelper:
         con los kwargs enviados. Devuelve la respuesta de OpenAI.
         """
 
+        start = time.perf_counter()
         with get_openai_callback() as cb:
             llmn_response = self.structured_llm.invoke(prompt)
+        self._record_usage(cb, time.perf_counter() - start)
         return llmn_response, cb
 
+    def run_sharded(self, prompt_name: str, transcript: str, **kwargs) -> tuple[dict, OpenAICallbackHandler]:
+        """
+        Structured extraction that does not overflow OPENAI_MAX_TOKENS on long transcripts.
+
+        The transcript goes through a single call unless its output does not
+        fit: when more than LLM_SHARD_BRAWLERS brawlers (by default derived
+        from OPENAI_MAX_TOKENS) are detected in the transcript up front, it is
+        split into overlapping windows, one per LLM_SHARD_BRAWLERS detected
+        brawlers, extracted concurrently (LLM_SHARD_CONCURRENCY) with the same
+        prompt. Any call that comes back truncated (finish_reason == "length")
+        is split in two and retried. The partial TranscriptAnalysisResult
+        objects are merged deterministically (see utils.merge_analysis_results).
+
+        Args:
+            prompt_name (str): Prompt with a `transcript` placeholder.
+            transcript (str): Full transcript text.
+            **kwargs: The other placeholders of the prompt.
+
+        Returns:
+            tuple: (result, callback with the usage of all calls).
+        """
+        shards = self._shard_count(transcript)
+        windows = self._split(transcript, shards) if shards > 1 else [transcript]
+
+        start = time.perf_counter()
+        with get_openai_callback() as cb:
+            results = self._extract(prompt_name, windows, kwargs)
+        self._record_usage(cb, time.perf_counter() - start)
+        if len(results) == 1:
+            return results[0], cb
+        return utils.merge_analysis_results(results), cb
+
+    def _extract(self, prompt_name: str, windows: list, kwargs: dict, depth: int = 0) -> list:
+        prompts = [
+            self.load_prompt_template(prompt_name, transcript=window, **kwargs)
+            for window in windows
+        ]
+        responses = self.structured_llm_raw.batch(
+            prompts, config={"max_concurrency": self.shard_concurrency}
+        )
+        results = []
+        for window, response in zip(windows, responses):
+            if response["raw"].response_metadata.get("finish_reason") == "length":
+                # La salida no entró en OPENAI_MAX_TOKENS: se divide esa parte en dos
+                halves = self._split(window, 2)
+                if depth >= self.max_resplits or len(halves) < 2:
+                    raise RuntimeError("La salida del LLM se trunca aun dividiendo el transcript")
+                results.extend(self._extract(prompt_name, halves, kwargs, depth + 1))
+            elif response["parsing_error"] is not None:
+                raise response["parsing_error"]
+            else:
+                results.append(response["parsed"])
+        return results
+
+    def _split(self, text: str, parts: int) -> list:
+        # Ventanas de len / parts más el overlap, así salen `parts` partes
+        return utils.split_transcript(
+            text,
+            max_chars=math.ceil(len(text) / parts) + self.shard_overlap,
+            overlap=self.shard_overlap,
+        )
+
+    def _shard_count(self, transcript: str) -> int:
+        if self.shard_brawlers <= 0:
+            return 1
+        brawlers = len(self.brawler_finder.find_brawlers(transcript))
+        return max(1, math.ceil(brawlers / self.shard_brawlers))
+
+    def _record_usage(self, cb: OpenAICallbackHandler, seconds: float) -> None:
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            self.usage["prompt_tokens"] += cb.prompt_tokens
+            self.usage["cached_prompt_tokens"] += cb.prompt_tokens_cached
+            self.usage["completion_tokens"] += cb.completion_tokens
+            self.usage["seconds"] += seconds
@@ -0,0 +1,64 @@
+import threading
+from langchain_core.prompts import ChatPromptTemplate
+from llm_helpers import prompts
+
+
+class CompiledPrompt:
+    """ A prompt compiled once: the ChatPromptTemplate and its placeholders. """
+
+    def __init__(self, name: str, prefix: str, suffix: str | None) -> None:
+        self.name = name
+        messages = [("system", prefix)]
+        if suffix is not None:
+            messages.append(("human", suffix))
+        self.template = ChatPromptTemplate.from_messages(messages)
+        self.input_variables = set(self.template.input_variables)
+
+    def validate(self, kwargs: dict) -> None:
+        missing = sorted(self.input_variables - set(kwargs))
+        if missing:
+            raise ValueError(f"Missing placeholders: {missing}")
+
+
+class PromptRegistry:
+    """
+    Compiles and validates each prompt in prompts.py once per process.
+
+    A prompt named NAME is either split into NAME_PREFIX (stable system
+    message) and NAME_SUFFIX (variable user message), or is a single NAME
+    string used as the system message.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._compiled: dict[str, CompiledPrompt] = {}
+
+    def get(self, prompt_name: str) -> CompiledPrompt:
+        """
+        Get the compiled prompt, compiling it on first use.
+
+        Args:
+            prompt_name (str): Prompt variable name in prompts.py (without _PREFIX/_SUFFIX).
+
+        Returns:
+            CompiledPrompt: The compiled prompt.
+        """
+        compiled = self._compiled.get(prompt_name)
+        if compiled is not None:
+            return compiled
+
+        with self._lock:
+            if prompt_name not in self._compiled:
+                if hasattr(prompts, f"{prompt_name}_PREFIX"):
+                    prefix = getattr(prompts, f"{prompt_name}_PREFIX")
+                    suffix = getattr(prompts, f"{prompt_name}_SUFFIX", None)
+                elif hasattr(prompts, prompt_name):
+                    prefix, suffix = getattr(prompts, prompt_name), None
+                else:
+                    raise ValueError(f"Prompt variable '{prompt_name}' not found in prompts folder")
+                self._compiled[prompt_name] = CompiledPrompt(prompt_name, prefix, suffix)
+            return self._compiled[prompt_name]
+
+
+# Registro compartido por todas las instancias de LlmHelper
+registry = PromptRegistry()
@@ -1,4 +1,7 @@
-YOUTUBE_VIDEO_BRIEF = """
+# Prompts split into a stable PREFIX (system: rules, brawler list, output format)
+# and a variable SUFFIX (user: the transcript). Keeping the prefix identical
+# across calls lets the provider reuse its prompt cache for it.
+YOUTUBE_VIDEO_BRIEF_PREFIX = """
 
 You are an expert game analyst specialized in Brawl Stars. You will receive a transcript from a YouTube video discussing Brawl Stars.
 Below is a list of Brawl Stars brawlers and their characteristics. Use it to correctly identify characters mentioned in the transcript.  
@@ -18,6 +21,9 @@ IMPORTANT RULES:
 6. Each brawler must have context_in_transcript (general discussion) and relevant_tips_or_strategies (combat tips or strategies mentioned).
 7. Meta notes must summarize general recommendations for the current season/meta to maximize wins and minimize losses.
 8. You must include every brawler from the official list that is mentioned in the transcript. Do not omit any matching brawler, even if the context or tips are brief.
+9. For each brawler also output:
+   - tier: the tier letter the creator assigns to the brawler ("S", "A", "B", "C", "D" or "F"), or "" if no tier is stated. Never guess a tier.
+   - sentiment: the creator's overall verdict on the brawler in the current meta: "positive", "negative", "mixed" or "neutral". A buff or a single good mode does not make a brawler positive if the creator rates it weak overall.
 
 TASK STEPS:
 1: Internally detect and correct any transcription errors (but do NOT output them).
@@ -34,13 +40,16 @@ OUTPUT STRUCTURE:
     {{
       "name": "",
       "context_in_transcript": "",
-      "relevant_tips_or_strategies": ""
+      "relevant_tips_or_strategies": "",
+      "tier": "",
+      "sentiment": ""
     }}
   ],
   "meta_notes": ""
 }}
+"""
 
-
+YOUTUBE_VIDEO_BRIEF_SUFFIX = """
 Transcript:
 "{transcript}"
 
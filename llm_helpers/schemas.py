@@ -4,6 +4,8 @@ class BrawlerMention(TypedDict):
     name: str
     context_in_transcript: str
     relevant_tips_or_strategies: str
+    tier: str  # "S", "A", "B", "C", "D", "F" or "" if the video gives no tier
+    sentiment: str  # "positive", "negative", "mixed" or "neutral"
 
 class TranscriptAnalysisResult(TypedDict):
     summary: str
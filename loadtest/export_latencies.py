@@ -0,0 +1,90 @@
+"""
+Export per-stage latency samples from production traces in Langfuse.
+
+Reads the observations recorded by the @observe spans of ProcessVideo and
+VertexAIRagHelper and writes their durations (seconds) in the format of
+`loadtest/latencies.json`, so load tests replay real latency distributions.
+
+Example:
+    python -m loadtest.export_latencies --days 7 --limit 1000 \
+        --output loadtest/latencies.json
+"""
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from tracing_helpers import tracing_helper
+
+# Etapa del stub -> nombre de la observación (@observe usa el nombre de la función)
+STAGE_OBSERVATIONS = {
+    "transcript": "transcribe_video",
+    "brief": "analyze_transcript",
+    "upload": "upload_chunks",
+    "import": "import_chunks",
+    "query": "query_rag_corpus",
+}
+
+
+def export_stage(langfuse, name: str, since: datetime, limit: int, environment: str = None) -> list[float]:
+    """
+    Durations of the most recent observations with a given name.
+
+    Args:
+        langfuse (Langfuse): Client from tracing_helper.get_langfuse().
+        name (str): Observation name.
+        since (datetime): Only observations started after this time.
+        limit (int): Maximum number of samples (the API caps a page at 1000).
+        environment (str, optional): Langfuse tracing environment to read.
+
+    Returns:
+        list: Durations in seconds, sorted ascending.
+    """
+    response = langfuse.api.observations.get_many(
+        name=name,
+        from_start_time=since,
+        environment=environment,
+        limit=min(limit, 1000),
+    )
+    samples = [
+        (o.end_time - o.start_time).total_seconds()
+        for o in response.data
+        if o.start_time is not None and o.end_time is not None
+    ]
+    return sorted(round(s, 3) for s in samples if s >= 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export stage latencies from Langfuse")
+    parser.add_argument("--days", type=float, default=7, help="look-back window")
+    parser.add_argument("--limit", type=int, default=1000, help="samples per stage")
+    parser.add_argument("--environment", default=None, help="Langfuse tracing environment (e.g. production)")
+    parser.add_argument("--output", default="loadtest/latencies.json")
+    args = parser.parse_args()
+
+    langfuse = tracing_helper.get_langfuse()
+    since = datetime.now(timezone.utc) - timedelta(days=args.days)
+
+    latencies = {
+        "_comment": (
+            f"Exported from Langfuse on {datetime.now(timezone.utc).date().isoformat()} "
+            f"({args.days:g} days, environment={args.environment or 'all'})."
+        )
+    }
+    for stage, name in STAGE_OBSERVATIONS.items():
+        samples = export_stage(langfuse, name, since, args.limit, args.environment)
+        if not samples:
+            print(f"⚠️ Sin observaciones '{name}' para la etapa {stage}")
+            continue
+        latencies[stage] = samples
+        print(f"✅ {stage}: {len(samples)} muestras, p50={samples[len(samples) // 2]}s")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(latencies, f, indent=4)
+    tracing_helper.shutdown()
+
+
+if __name__ == "__main__":
+    main()
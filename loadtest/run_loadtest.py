@@ -0,0 +1,210 @@
+"""
+HTTP load / soak test harness for the Flask service.
+
+For every gunicorn configuration (workers x threads) it starts
+`loadtest.stub_app:app`, runs a concurrency sweep against each endpoint and,
+optionally, a long soak run. It reports p50/p95/p99 latency, throughput,
+error rate and RSS growth of the gunicorn process tree.
+
+Example:
+    python -m loadtest.run_loadtest --configs 2x4,1x8,4x2 --concurrency 1,4,8,16 \
+        --duration 30 --soak 900 --output loadtest_results.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import requests
+
+
+def _process_payload(duplicate_ratio: float) -> dict:
+    # Con duplicate_ratio > 0 se repiten videos para ejercitar el single-flight
+    if random.random() < duplicate_ratio:
+        vid = f"dup{random.randint(0, 9)}".ljust(11, "0")
+    else:
+        vid = uuid.uuid4().hex[:11]
+    return {"url": f"https://www.youtube.com/watch?v={vid}"}
+
+
+def _query_payload(duplicate_ratio: float) -> dict:
+    # Mezcla preguntas que resuelve el agregado con preguntas abiertas (RAG)
+    return {"query": random.choice([
+        "Is Grom strong in the current meta?",
+        "Tips for Grom?",
+        "What is the best team comp for Gem Grab right now?",
+        "How do I counter throwers on Hot Zone?",
+    ])}
+
+
+ENDPOINTS = {
+    "process": ("/process", _process_payload),
+    "query": ("/query", _query_payload),
+}
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def rss_mb(root_pid: int) -> float:
+    """ Resident memory of a process and all its descendants (Linux /proc). """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+
+    total_kb, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+def start_server(workers: int, threads: int, port: int) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn",
+            "--bind", f"127.0.0.1:{port}",
+            "--workers", str(workers),
+            "--threads", str(threads),
+            "--timeout", "120",
+            "loadtest.stub_app:app",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"gunicorn did not start on port {port}")
+
+
+def run_phase(base_url: str, endpoint: str, concurrency: int, duration: float,
+              duplicate_ratio: float, server_pid: int, rss_interval: float = 5.0) -> dict:
+    """ Keep `concurrency` clients busy against `endpoint` for `duration` seconds. """
+    path, payload_fn = ENDPOINTS[endpoint]
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client():
+        nonlocal errors
+        session = requests.Session()
+        while time.time() < stop_at:
+            start = time.perf_counter()
+            try:
+                ok = session.post(base_url + path, json=payload_fn(duplicate_ratio), timeout=120).ok
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors += 0 if ok else 1
+
+    rss_samples = [rss_mb(server_pid)]
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for t in clients:
+        t.start()
+    while any(t.is_alive() for t in clients):
+        time.sleep(min(rss_interval, max(stop_at - time.time(), 0.1)))
+        rss_samples.append(rss_mb(server_pid))
+    wall = time.perf_counter() - started
+
+    total = len(latencies)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": round(total / wall, 2) if wall else 0.0,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "rss_start_mb": round(rss_samples[0], 1),
+        "rss_end_mb": round(rss_samples[-1], 1),
+        "rss_growth_mb": round(rss_samples[-1] - rss_samples[0], 1),
+    }
+
+
+def print_report(rows: list[dict]) -> None:
+    header = ["config", "phase", "endpoint", "conc", "reqs", "rps", "err%",
+              "p50_ms", "p95_ms", "p99_ms", "rss_mb", "rss_growth"]
+    print(" | ".join(header))
+    for r in rows:
+        print(" | ".join(str(v) for v in [
+            r["config"], r["phase"], r["endpoint"], r["concurrency"], r["requests"],
+            r["throughput_rps"], round(r["error_rate"] * 100, 2), r["p50_ms"],
+            r["p95_ms"], r["p99_ms"], r["rss_end_mb"], r["rss_growth_mb"],
+        ]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load / soak test for the Flask service")
+    parser.add_argument("--configs", default="2x4", help="workers x threads, comma separated (e.g. 2x4,1x8)")
+    parser.add_argument("--concurrency", default="1,4,8,16", help="concurrency levels for the sweep")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per sweep step")
+    parser.add_argument("--soak", type=float, default=0, help="seconds of soak run per config (0 = skip)")
+    parser.add_argument("--soak-concurrency", type=int, default=8)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="endpoints to test")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="share of requests for repeated videos")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--output", default="", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    rows = []
+    for config in args.configs.split(","):
+        workers, threads = (int(x) for x in config.lower().split("x"))
+        server = start_server(workers, threads, args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+        try:
+            for endpoint in args.endpoints.split(","):
+                for concurrency in (int(c) for c in args.concurrency.split(",")):
+                    row = run_phase(base_url, endpoint, concurrency, args.duration,
+                                    args.duplicate_ratio, server.pid)
+                    rows.append({"config": config, "phase": "sweep", **row})
+                if args.soak > 0:
+                    row = run_phase(base_url, endpoint, args.soak_concurrency, args.soak,
+                                    args.duplicate_ratio, server.pid, rss_interval=30.0)
+                    rows.append({"config": config, "phase": "soak", **row})
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print_report(rows)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
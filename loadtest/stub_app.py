@@ -0,0 +1,92 @@
+"""
+Flask app from `main` with stubbed backends, for load and soak tests.
+
+YouTube, LLM, GCS and RAG Engine calls are replaced by sleeps drawn from the
+latency samples in `LOADTEST_LATENCIES` (default: loadtest/latencies.json,
+a placeholder until replaced by `loadtest.export_latencies`), so the HTTP
+layer, gunicorn workers/threads and ProcessVideo itself are exercised
+without spending credits.
+
+    gunicorn --workers 2 --threads 4 loadtest.stub_app:app
+"""
+import os
+import json
+import time
+import random
+
+# Nunca llamar a Vertex AI desde el load test
+os.environ["USE_VERTEX"] = "false"
+os.environ.setdefault("CHECKPOINT_DIR", "/tmp/loadtest_checkpoints")
+os.environ.setdefault("DEDUP_INDEX_PATH", "/tmp/loadtest_dedup_index.jsonl")
+os.environ.setdefault("BRAWLER_AGGREGATES_PATH", "/tmp/loadtest_brawler_aggregates.json")
+
+import main
+from process_video import ProcessVideo
+from youtube_helpers.youtube_helper import YouTubeHelper as yt
+
+LATENCIES_PATH = os.getenv(
+    "LOADTEST_LATENCIES",
+    os.path.join(os.path.dirname(__file__), "latencies.json")
+)
+TRANSCRIPT_WORDS = int(os.getenv("LOADTEST_TRANSCRIPT_WORDS", "4000"))
+
+
+class StubProcessVideo(ProcessVideo):
+    """ ProcessVideo whose external calls sleep for a sampled latency. """
+
+    def __init__(self, latencies: dict):
+        super().__init__()
+        # Recorre el camino completo (brief + chunks + RAG) con backends simulados
+        self.use_vertex = True
+        self.latencies = latencies
+
+    def _sleep(self, stage: str):
+        samples = self.latencies.get(stage)
+        if samples:
+            time.sleep(random.choice(samples))
+
+    def transcribe_video(self, url: str) -> dict:
+        self._sleep("transcript")
+        vid = yt.extract_video_id(url)
+        # Texto distinto por video: si no, el índice de duplicados saltearía el brief
+        rnd = random.Random(vid)
+        words = [f"word{rnd.randrange(5000)}" for _ in range(TRANSCRIPT_WORDS)]
+        return {
+            "video_id": vid,
+            "title": "stub_title",
+            "publish_date": "2025-07-10",
+            "text": " ".join(words),
+            "segments_count": len(words) // 10,
+        }
+
+    def analyze_transcript(self, text: str) -> tuple[dict, int]:
+        self._sleep("brief")
+        brief = {
+            "summary": text[:500],
+            "key_topics": ["stub"],
+            "brawlers_mentioned": [
+                {"name": "Grom", "context_in_transcript": text[:200], "relevant_tips_or_strategies": text[200:400],
+                 "tier": "B", "sentiment": "mixed"}
+            ],
+            "meta_notes": text[400:600],
+        }
+        return brief, len(text) // 4
+
+    def upload_chunks(self, vid: str, chunks: list, partition: str) -> str:
+        self._sleep("upload")
+        return f"gs://stub-bucket/rag_upload/{partition}/{vid}.jsonl"
+
+    def import_chunks(self, gcs_path: str, partition: str) -> dict:
+        self._sleep("import")
+        return {"name": "operations/stub", "imported": 1, "skipped": 0, "failed": 0}
+
+    def query_rag(self, query: str) -> str:
+        self._sleep("query")
+        return "stub answer"
+
+
+with open(LATENCIES_PATH, "r", encoding="utf-8") as f:
+    latencies = {k: v for k, v in json.load(f).items() if not k.startswith("_")}
+
+main.video_processor = StubProcessVideo(latencies)
+app = main.app
@@ -21,6 +21,20 @@ def process_video_route():
     try:
         result = video_processor.process(url)
         return jsonify(result)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/query", methods=["POST"])
+def query_route():
+    data = request.get_json(silent=True)
+    if not data or "query" not in data:
+        return jsonify({"error": "Debes enviar un JSON con {\"query\": \"<pregunta>\"}"}), 400
+
+    try:
+        result = video_processor.query(data["query"])
+        return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,156 @@
+"""
+Migra el corpus RAG sin particionar (CORPUS_DISPLAY_NAME, p. ej. "youtube_videos")
+a las particiones por ventana de publicación.
+
+Con particiones activas las consultas solo buscan en `youtube_videos_<AAAA>_<MM>`,
+así que lo importado antes en el corpus único deja de ser alcanzable:
+
+- Los JSONL que quedaron en GCS sin partición (rag_upload/<video_id>.jsonl, o
+  rag_upload/<corpus>/ con CORPUS_PARTITION_MONTHS=0) se copian a
+  rag_upload/<partición>/ según el publish_date de sus chunks y se importan.
+- Los archivos del corpus sin JSONL en GCS (p. ej. los .txt de la primera
+  versión) se vuelven a procesar por video_id con ProcessVideo. Si el
+  checkpoint del video apunta a otra partición, se borran sus etapas de
+  partición, subida e importación para que se importe de nuevo.
+
+Con --delete-legacy el corpus viejo se borra solo si no hubo errores y cada
+video migrado está en su partición.
+
+    python migrate_corpus.py [--delete-legacy]
+"""
+import os
+import sys
+import json
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from vertexai import rag
+from process_video import ProcessVideo, VIDEO_ID_PATTERN
+from vertexairag_helpers import corpus_partitions
+from tracing_helpers import tracing_helper
+
+# Etapas que dependen de la partición (ver ProcessVideo._process)
+PARTITION_STAGES = ("partition", "new_chunks", "gcs_path", "import_operation")
+
+
+def legacy_jsonl_files(pipeline: ProcessVideo, base: str) -> list[str]:
+    """ JSONL subidos sin partición: rag_upload/<vid>.jsonl y rag_upload/<base>/<vid>.jsonl. """
+    files = []
+    for name in pipeline.gcs_helper.list_files(prefix="rag_upload/"):
+        folder, _, file_name = name[len("rag_upload/"):].rpartition("/")
+        vid, ext = os.path.splitext(file_name)
+        if folder in ("", base) and ext == ".jsonl" and VIDEO_ID_PATTERN.fullmatch(vid):
+            files.append(name)
+    return files
+
+
+def migrate_jsonl(pipeline: ProcessVideo, base: str, vid: str, remote_path: str) -> str:
+    """ Copia un JSONL del corpus viejo a su partición y lo importa. Devuelve la partición. """
+    raw = pipeline.gcs_helper.download_string(remote_path)
+    chunks = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    publish_date = next(
+        (r["allow"][0] for r in chunks[0]["restricts"] if r["namespace"] == "publish_date" and r["allow"]), ""
+    )
+    partition = corpus_partitions.partition_name(base, publish_date)
+    gcs_path = pipeline.gcs_helper.upload_string(
+        raw, f"rag_upload/{partition}/{vid}.jsonl", content_type="application/jsonl"
+    )
+    operation = pipeline.import_chunks(gcs_path, partition)
+    pipeline.chunk_hashes.mark_imported(partition, chunks)
+
+    # El checkpoint queda apuntando a la partición, así un reproceso no reimporta
+    checkpoint = pipeline.checkpoints.load(vid)
+    if checkpoint is not None:
+        checkpoint["stages"].update(
+            {"partition": partition, "new_chunks": chunks, "gcs_path": gcs_path, "import_operation": operation}
+        )
+        pipeline.checkpoints.mark_completed(checkpoint)
+    return partition
+
+
+def reprocess(pipeline: ProcessVideo, base: str, vid: str) -> str | None:
+    """ Reprocesa un video del corpus viejo hasta importarlo en su partición. Devuelve la partición. """
+    checkpoint = pipeline.checkpoints.load(vid)
+    transcript = checkpoint["stages"].get("transcript") if checkpoint else None
+    if transcript is not None:
+        partition = corpus_partitions.partition_name(base, transcript["publish_date"])
+        if checkpoint["stages"].get("partition") != partition:
+            # Checkpoint completo del corpus viejo: sin esto _process no sube ni importa nada
+            pipeline.checkpoints.clear_stages(checkpoint, *PARTITION_STAGES)
+
+    pipeline.process(f"https://www.youtube.com/watch?v={vid}")
+    return pipeline.checkpoints.load(vid)["stages"].get("partition")
+
+
+def is_in_partition(pipeline: ProcessVideo, vid: str, partition: str, files: dict) -> bool:
+    """ True si el contenido del video ya se puede consultar en la partición. """
+    if partition not in files:
+        corpus = pipeline.rag_helper.get_rag_corpus_display_name(partition)
+        names = {f.display_name for f in pipeline.rag_helper.list_files(corpus.name)} if corpus else set()
+        files[partition] = names
+    if f"{vid}.jsonl" in files[partition]:
+        return True
+    # Sin archivo propio: todos sus chunks ya estaban en la partición (re-subida)
+    checkpoint = pipeline.checkpoints.load(vid)
+    stages = checkpoint["stages"] if checkpoint else {}
+    return stages.get("partition") == partition and stages.get("new_chunks") == []
+
+
+if __name__ == "__main__":
+    base = os.getenv("CORPUS_DISPLAY_NAME", "youtube_videos")
+    delete_legacy = "--delete-legacy" in sys.argv[1:]
+    if corpus_partitions.PARTITION_MONTHS <= 0:
+        sys.exit("CORPUS_PARTITION_MONTHS=0: no hay particiones a las que migrar")
+
+    pipeline = ProcessVideo()
+    if not pipeline.use_vertex:
+        sys.exit("La migración necesita USE_VERTEX=true")
+    legacy = pipeline.rag_helper.get_rag_corpus_display_name(base)
+    if legacy is None:
+        sys.exit(f"No existe el corpus {base}: nada que migrar")
+
+    migrated, errors, skipped = {}, [], []
+    # 1. JSONL en GCS: no hace falta volver a llamar al LLM
+    for remote_path in legacy_jsonl_files(pipeline, base):
+        vid = os.path.splitext(os.path.basename(remote_path))[0]
+        try:
+            migrated[vid] = migrate_jsonl(pipeline, base, vid, remote_path)
+            print(f"📦 {vid} -> {migrated[vid]}")
+        except Exception as e:
+            errors.append(vid)
+            print(f"❌ {vid}: {e}")
+
+    # 2. Archivos del corpus sin JSONL: se reprocesa el video completo
+    for rag_file in pipeline.rag_helper.list_files(legacy.name):
+        vid = os.path.splitext(rag_file.display_name)[0]
+        if vid in migrated or vid in errors or not VIDEO_ID_PATTERN.fullmatch(vid):
+            continue
+        try:
+            partition = reprocess(pipeline, base, vid)
+            if partition is None:
+                # Duplicado salteado (DEDUP_MODE=skip): su contenido es el del original
+                skipped.append(vid)
+                print(f"♻️ {vid} es duplicado, no se importa")
+                continue
+            migrated[vid] = partition
+            print(f"🔁 {vid} -> {partition}")
+        except Exception as e:
+            errors.append(vid)
+            print(f"❌ {vid}: {e}")
+
+    # 3. Verifica que cada video migrado esté en su partición
+    files = {}
+    missing = [vid for vid, partition in migrated.items() if not is_in_partition(pipeline, vid, partition, files)]
+    for vid in missing:
+        print(f"⚠️ {vid} no aparece en {migrated[vid]}")
+
+    print(f"✅ {len(migrated) - len(missing)} videos migrados, {len(skipped)} duplicados, "
+          f"{len(errors)} con error, {len(missing)} sin verificar")
+    if delete_legacy:
+        if errors or missing:
+            print(f"⚠️ {base} no se borra: hay videos sin migrar")
+        else:
+            rag.delete_corpus(name=legacy.name)
+            print(f"🗑️ {base} borrado")
+    tracing_helper.shutdown()
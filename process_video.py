@@ -1,7 +1,17 @@
 import os
+import re
+import time
+import asyncio
 from dotenv import load_dotenv
-from google.cloud import aiplatform
+from langfuse import observe
 from youtube_helpers.youtube_helper import YouTubeHelper as yt
+from concurrency_helpers.single_flight_helper import SingleFlightHelper
+from checkpoint_helpers.checkpoint_helper import CheckpointHelper
+from tracing_helpers import tracing_helper
+from dedup_helpers.containment_helper import ContainmentIndex
+from dedup_helpers.chunk_hash_helper import ChunkHashIndex
+from aggregate_helpers.brawler_aggregate_helper import BrawlerAggregateHelper
+from vertexairag_helpers import corpus_partitions
 import utils
 
 # Cargar variables desde .env
@@ -11,14 +21,22 @@ load_dotenv()
 USE_VERTEX = os.getenv("USE_VERTEX", "false").lower() == "true"
 if USE_VERTEX:
     import vertexai
-    from vertexai import rag
-    from vertexai.generative_models import GenerativeModel
+    from llm_helpers.llm_helper import LlmHelper
+    from llm_helpers.brawlers_data import get_brawlers_list
+    from gcs_helpers.gcs_helper import GCSHelper
+    from vertexairag_helpers.vertexai_rag_helper import VertexAIRagHelper
 
     vertexai.init(
         project=os.getenv("PROJECT_ID"),
         location=os.getenv("VERTEX_REGION", "us-central1")
     )
 
+# Los video_id de YouTube tienen 11 caracteres [A-Za-z0-9_-]
+VIDEO_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{11}")
+
+# Cambiar la versión invalida los checkpoints de ejecuciones anteriores
+PIPELINE_VERSION = os.getenv("PIPELINE_VERSION", "v1")
+
 creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 if creds_path and os.path.exists(creds_path):
     os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = creds_path
@@ -33,102 +51,256 @@ class ProcessVideo:
     Clase que encapsula toda la lógica de:
     - Extracción de video_id
     - Transcripción del video
-    - Procesamiento opcional con Vertex AI (resumen + RAG)
+    - Procesamiento opcional con Vertex AI (brief con LLM + chunks + RAG)
+
+    Cada etapa del modo Vertex guarda un checkpoint por video_id, así un
+    reintento continúa desde la última etapa completada.
     """
 
+    corpus_display_name = os.getenv("CORPUS_DISPLAY_NAME", "youtube_videos")
+    # "reuse": copia el brief del video original, "skip": no indexa el duplicado,
+    # "off": no busca duplicados
+    dedup_mode = os.getenv("DEDUP_MODE", "reuse")
+    embed_model = os.getenv("EMBED_MODEL_NAME", "text-embedding-005")
+
     def __init__(self):
         self.use_vertex = USE_VERTEX
         self.vertex_region = os.getenv("VERTEX_REGION", "us-central1")
         self.project_id = os.getenv("PROJECT_ID")
 
-        # Solo inicializamos RAG si está activo
-        self.corpus = None
+        # Deduplica pedidos concurrentes del mismo video_id.
+        # Con SINGLE_FLIGHT_LOCK_DIR también cubre los otros workers de gunicorn.
+        self.single_flight = SingleFlightHelper(
+            lock_dir=os.getenv("SINGLE_FLIGHT_LOCK_DIR"),
+            result_ttl=float(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "300"))
+        )
+        self.checkpoints = CheckpointHelper(PIPELINE_VERSION)
+        self.dedup_index = ContainmentIndex()
+        self.chunk_hashes = ChunkHashIndex()
+        self.brawler_aggregates = BrawlerAggregateHelper()
+
+        # Inicializa el cliente de tracing compartido antes de los @observe
+        tracing_helper.get_langfuse()
+
+        # Solo inicializamos LLM, GCS y RAG si está activo.
+        # Los corpus (uno por ventana de publish_date) se resuelven al importar.
         if self.use_vertex:
-            self.corpus = self._get_or_create_corpus("youtube_videos")
+            self.llm_helper = LlmHelper()
+            self.gcs_helper = GCSHelper()
+            self.rag_helper = VertexAIRagHelper(self.project_id, gcs_helper=self.gcs_helper)
 
-    # --- SRP 1: Obtener video_id y transcripción ---
-    def transcribe_video(self, url: str):
+    # --- SRP 1: Obtener video_id, metadatos y transcripción ---
+    @observe(capture_output=False)
+    def transcribe_video(self, url: str) -> dict:
         yt_helper = yt(url)
-        vid = yt_helper.extract_video_id()
-        text, segments = yt_helper.get_transcript()
-        return vid, text, segments
+        data = yt_helper.extract_all()
+        return {
+            "video_id": yt_helper.video_id,
+            "title": data["title"],
+            "publish_date": data["publish_date"],
+            "text": data["transcript_text"],
+            "segments_count": len(data["transcript_snippets"]),
+            "language": data["transcript_language"],
+        }
 
-    # --- SRP 2: Resumir texto usando Gemini ---
-    def summarize_text(self, text: str, max_tokens: int = 2000) -> str:
-        if not self.use_vertex:
-            return None
-        model = GenerativeModel(model_name=os.getenv("VERTEX_MODEL_NAME", "gemini-1.5-flash-002"))
-        response = model.generate_content(
-            f"Resume este texto de un video de YouTube en español:\n\n{text[:max_tokens]}"
+    # --- SRP 2: Brief estructurado del transcript con el LLM ---
+    @observe(capture_input=False)
+    def analyze_transcript(self, text: str) -> tuple[dict, int]:
+        # Transcripts largos se extraen por partes en paralelo para no truncar la salida
+        start = time.perf_counter()
+        llm_response, cb = self.llm_helper.run_sharded(
+            "YOUTUBE_VIDEO_BRIEF",
+            transcript=text,
+            brawlers_list=get_brawlers_list()
         )
-        return response.text
+        # Tokens de prompt servidos desde el caché del proveedor, para ver el ahorro por llamada
+        tracing_helper.get_langfuse().update_current_span(metadata={
+            "prompt_tokens": cb.prompt_tokens,
+            "cached_prompt_tokens": cb.prompt_tokens_cached,
+            "completion_tokens": cb.completion_tokens,
+            "llm_requests": cb.successful_requests,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "cumulative_usage": dict(self.llm_helper.usage),
+        })
+        return utils.filter_brawlers(llm_response), cb.total_tokens
 
-    # --- SRP 3: Guardar texto e indexar en RAG ---
-    def index_in_rag(self, vid: str, text: str):
-        if not self.use_vertex:
-            return None
-
-        # Guardamos temporalmente
-        fname = f"/tmp/{vid}.txt"
-        with open(fname, "w") as f:
-            f.write(text)
-
-        # Importamos en RAG Engine
-        rag.import_files(
-            self.corpus.name,
-            [fname],
-            transformation_config=rag.TransformationConfig(
-                chunking_config=rag.ChunkingConfig(
-                    chunk_size=512,
-                    chunk_overlap=100
-                )
-            )
-        )
-        return True
+    # --- SRP 2b: Detectar re-subidas antes de pagar el análisis ---
+    def find_duplicate(self, vid: str, text: str) -> tuple[dict | None, list]:
+        signature = self.dedup_index.signature(text)
+        if self.dedup_mode == "off":
+            return None, signature
+        return self.dedup_index.query(signature, exclude=vid), signature
+
+    # --- SRP 3: Chunks, subida a GCS e importación en RAG ---
+    @observe(capture_input=False, capture_output=False)
+    def build_chunks(self, transcript: dict, brief: dict) -> list:
+        file_id = f"{transcript['video_id']}_{transcript['title']}"
+        return utils.process_video_dict(brief, file_id=file_id, publish_date=transcript["publish_date"])
+
+    @observe(capture_input=False)
+    def upload_chunks(self, vid: str, chunks: list, partition: str) -> str:
+        fname = f"/tmp/{vid}.jsonl"
+        utils.save_chunks_to_jsonl(chunks, file_name=fname)
+        return self.gcs_helper.upload_file(fname, f"rag_upload/{partition}/{vid}.jsonl")
+
+    @observe()
+    def import_chunks(self, gcs_path: str, partition: str) -> dict:
+        corpus = self.rag_helper.get_or_create_corpus(partition, self.embed_model)
+        # Espera a que termine la importación: si falla, el checkpoint queda incompleto
+        name, counts = asyncio.run(self.rag_helper.import_files_and_wait(
+            corpus_name=corpus.name,
+            gcs_path=gcs_path
+        ))
+        return {"name": name, **counts}
 
     # --- Método público para procesar todo ---
     def process(self, url: str):
         """
         Procesa un video de YouTube:
         - Obtiene transcripción
-        - Opcionalmente resume e indexa en RAG
+        - Opcionalmente genera el brief, los chunks y los indexa en RAG
+
+        Pedidos concurrentes para el mismo video_id esperan una única
+        ejecución y comparten su resultado.
+        """
+        vid = yt.extract_video_id(url)
+        # Valida antes de que el video_id llegue a locks, checkpoints o GCS
+        if not VIDEO_ID_PATTERN.fullmatch(vid):
+            raise ValueError(f"URL de YouTube inválida: {url}")
+        result, _ = self.single_flight.do(vid, lambda: self._process(vid, url))
+        return result
+
+    # --- Consultas ---
+    def query(self, query: str) -> dict:
         """
-        vid, text, segments = self.transcribe_video(url)
+        Responde una pregunta sobre el meta:
+        - Preguntas comunes por brawler ("is X strong", "tips for X") desde el agregado
+        - Preguntas abiertas con RAG + Gemini (solo en modo Vertex)
+        """
+        answer = self.brawler_aggregates.answer(query)
+        if answer is not None:
+            return {"source": "aggregate", **answer}
+        if not self.use_vertex:
+            return {"source": "none", "answer": None}
+        return {"source": "rag", "answer": self.query_rag(query)}
+
+    def query_rag(self, query: str) -> str:
+        # Por defecto la partición más reciente (y la anterior mientras la nueva es joven)
+        display_names = [self.corpus_display_name]
+        if corpus_partitions.PARTITION_MONTHS > 0:
+            display_names = self.rag_helper.select_partitions(self.corpus_display_name, query)
+        if len(display_names) == 1:
+            response = self.rag_helper.query_rag_corpus(display_names[0], query)
+        else:
+            response = self.rag_helper.query_rag_partitions(display_names, query)
+        return response.text
+
+    def resume_incomplete(self) -> list:
+        """ Reanuda todos los videos cuyo pipeline quedó incompleto (crash, deploy, error). """
+        results = []
+        for checkpoint in self.checkpoints.list_incomplete():
+            try:
+                results.append(self.process(checkpoint["url"]))
+            except Exception as e:
+                results.append({"video_id": checkpoint["video_id"], "error": str(e)})
+        return results
 
+    @observe(name="process_video")
+    def _process(self, vid: str, url: str):
         # Si solo queremos test local
         if not self.use_vertex:
+            transcript = self.transcribe_video(url)
+            text = transcript["text"]
             return {
                 "video_id": vid,
                 "mode": "local",
                 "transcript_preview": text[:500] + ("..." if len(text) > 500 else ""),
-                "segments_count": len(segments)
+                "segments_count": transcript["segments_count"]
+            }
+
+        # Modo Vertex: cada etapa se saltea si ya está en el checkpoint
+        checkpoint = self.checkpoints.load(vid) or self.checkpoints.new(vid, url)
+        stages = checkpoint["stages"]
+        resumed_from = list(stages)
+
+        if "transcript" not in stages:
+            self.checkpoints.save_stage(checkpoint, "transcript", self.transcribe_video(url))
+        transcript = stages["transcript"]
+
+        if "brief" not in stages and "duplicate_of" not in stages:
+            duplicate, signature = self.find_duplicate(vid, transcript["text"])
+            original = self.checkpoints.load(duplicate["video_id"]) if duplicate else None
+            original_brief = original["stages"].get("brief") if original else None
+
+            if duplicate and (self.dedup_mode == "skip" or original_brief is not None):
+                total_saved = self.dedup_index.record_saved(duplicate.get("llm_tokens", 0))
+                print(
+                    f"♻️ {vid} es casi duplicado de {duplicate['video_id']} "
+                    f"(similitud {duplicate['similarity']}), tokens LLM ahorrados: "
+                    f"{duplicate.get('llm_tokens', 0)} (total: {total_saved})"
+                )
+                self.checkpoints.save_stage(checkpoint, "duplicate_of", duplicate)
+
+            if duplicate and self.dedup_mode == "skip":
+                self.checkpoints.mark_completed(checkpoint)
+            elif duplicate and original_brief is not None:
+                # Reutiliza el análisis del video original, pero indexa este video igual
+                self.checkpoints.save_stage(checkpoint, "brief", original_brief)
+            else:
+                brief, tokens = self.analyze_transcript(transcript["text"])
+                self.checkpoints.save_stage(checkpoint, "brief", brief)
+                self.dedup_index.add(vid, signature, llm_tokens=tokens)
+
+        duplicate = stages.get("duplicate_of") or {}
+        if "brief" not in stages:
+            # Duplicado salteado (DEDUP_MODE=skip): no se analiza ni se indexa
+            return {
+                "video_id": vid,
+                "mode": "vertex",
+                "duplicate_of": duplicate["video_id"],
+                "similarity": duplicate["similarity"],
+                "llm_tokens_saved": duplicate.get("llm_tokens", 0),
+                "segments_count": transcript["segments_count"]
             }
+        brief = stages["brief"]
 
-        # Modo Vertex: resumen + RAG
-        summary = self.summarize_text(text)
-        self.index_in_rag(vid, text)
+        # Un duplicado reutiliza el brief del original, que ya está en el agregado
+        if "aggregated" not in stages and not duplicate:
+            self.brawler_aggregates.add_video(vid, transcript["publish_date"], brief)
+            self.checkpoints.save_stage(checkpoint, "aggregated", True)
+
+        if "chunks" not in stages:
+            self.checkpoints.save_stage(checkpoint, "chunks", self.build_chunks(transcript, brief))
+
+        if "partition" not in stages:
+            partition = corpus_partitions.partition_name(self.corpus_display_name, transcript["publish_date"])
+            self.checkpoints.save_stage(checkpoint, "partition", partition)
+        partition = stages["partition"]
+
+        # Chunks cuyo texto ya está en la partición no se vuelven a embeber
+        if "new_chunks" not in stages:
+            self.checkpoints.save_stage(
+                checkpoint, "new_chunks", self.chunk_hashes.new_chunks(partition, stages["chunks"])
+            )
+        new_chunks = stages["new_chunks"]
+
+        if new_chunks and "gcs_path" not in stages:
+            self.checkpoints.save_stage(checkpoint, "gcs_path", self.upload_chunks(vid, new_chunks, partition))
+
+        if new_chunks and "import_operation" not in stages:
+            operation = self.import_chunks(stages["gcs_path"], partition)
+            self.chunk_hashes.mark_imported(partition, new_chunks)
+            self.checkpoints.save_stage(checkpoint, "import_operation", operation)
+
+        self.checkpoints.mark_completed(checkpoint)
 
         return {
             "video_id": vid,
             "mode": "vertex",
-            "summary": summary,
-            "segments_count": len(segments)
+            "summary": brief.get("summary"),
+            "segments_count": transcript["segments_count"],
+            "resumed_from": resumed_from,
+            "chunks_already_imported": len(stages["chunks"]) - len(new_chunks),
+            "duplicate_of": duplicate.get("video_id"),
+            "llm_tokens_saved": duplicate.get("llm_tokens", 0)
         }
-
-    # --- Helpers privados ---
-    def _get_or_create_corpus(self, name: str):
-        EMBED_MODEL = os.getenv("EMBED_MODEL_NAME", "text-embedding-005")
-        try:
-            return rag.get_corpus(name=name)
-        except:
-            cfg = rag.RagEmbeddingModelConfig(
-                vertex_prediction_endpoint=rag.VertexPredictionEndpoint(
-                    publisher_model="publishers/google/models/{EMBED_MODEL}"
-                )
-            )
-            return rag.create_corpus(
-                display_name=name,
-                backend_config=rag.RagVectorDbConfig(
-                    rag_embedding_model_config=cfg
-                )
-            )
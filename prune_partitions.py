@@ -0,0 +1,28 @@
+"""
+Aplica la política de retención a las particiones del corpus RAG.
+
+Las particiones cuya ventana terminó hace más de CORPUS_RETENTION_MONTHS se
+borran de RAG Engine. Con CORPUS_RETENTION_POLICY=archive (default) los JSONL
+quedan en GCS para poder reimportarlos; con "drop" también se borran.
+
+    python prune_partitions.py
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from gcs_helpers.gcs_helper import GCSHelper
+from vertexairag_helpers.vertexai_rag_helper import VertexAIRagHelper
+from vertexairag_helpers import corpus_partitions
+
+if __name__ == "__main__":
+    base = os.getenv("CORPUS_DISPLAY_NAME", "youtube_videos")
+    policy = corpus_partitions.RETENTION_POLICY
+    rag_helper = VertexAIRagHelper(os.getenv("PROJECT_ID"))
+    gcs_helper = GCSHelper() if policy == "drop" else None
+
+    removed = rag_helper.prune_partitions(base, policy=policy, gcs_helper=gcs_helper)
+    for name in removed:
+        print(f"🗑️ {name} ({policy})")
+    print(f"✅ {len(removed)} particiones vencidas")
@@ -0,0 +1,21 @@
+"""
+Reanuda todos los videos cuyo pipeline quedó incompleto (crash, deploy, error).
+
+Cada video continúa desde su último checkpoint, sin repetir la transcripción
+ni la llamada al LLM si ya estaban completas.
+
+    python resume_jobs.py
+"""
+import json
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from process_video import ProcessVideo
+from tracing_helpers import tracing_helper
+
+if __name__ == "__main__":
+    results = ProcessVideo().resume_incomplete()
+    print(json.dumps(results, indent=4, ensure_ascii=False))
+    print(f"🔁 {len(results)} videos reanudados")
+    tracing_helper.shutdown()
@@ -7,8 +7,18 @@ import json
 from youtube_helpers.youtube_helper import YouTubeHelper as yt
 from vertexairag_helpers.vertexai_rag_helper import VertexAIRagHelper, rag
 from gcs_helpers.gcs_helper import GCSHelper
+from vertexairag_helpers.query_router import QueryRouter
+from vertexairag_helpers import corpus_partitions
+from concurrency_helpers.single_flight_helper import SingleFlightHelper
+from checkpoint_helpers.checkpoint_helper import CheckpointHelper
+from dedup_helpers.containment_helper import ContainmentIndex
+from dedup_helpers.chunk_hash_helper import ChunkHashIndex
+from aggregate_helpers.brawler_aggregate_helper import BrawlerAggregateHelper
 import utils
 import asyncio
+import threading
+import time
+from datetime import date
 
 @pytest.fixture(scope="module")
 def video_url():
@@ -41,6 +51,9 @@ def test_transcribe_video_and_save(youtube_helper: yt):
     # Verifica los tipos de cada elemento
     assert isinstance(transcript_text, str)
     assert isinstance(segments, list)
+    assert youtube_helper.transcript_language is not None
+    # La segunda llamada sale del caché, sin volver a YouTube
+    assert youtube_helper.get_transcript()[0] == transcript_text
 
     # Guarda el texto en un archivo para otros tests
     os.makedirs("test", exist_ok=True)
@@ -79,6 +92,7 @@ def test_llm_response(transcribed_video: tuple, llm_helper: LlmHelper):
     with open("test/llm_usage_metrics.log", "a", encoding="utf-8") as logf:
         logf.write(
             f"Prompt tokens: {cb.prompt_tokens}, "
+            f"Cached prompt tokens: {cb.prompt_tokens_cached}, "
             f"Completion tokens: {cb.completion_tokens}, "
             f"Total tokens: {cb.total_tokens}, "
             f"Cost: ${cb.total_cost:.6f}\n"
@@ -87,6 +101,22 @@ def test_llm_response(transcribed_video: tuple, llm_helper: LlmHelper):
     assert isinstance(llm_response, dict)
     assert len(filtered_response["brawlers_mentioned"]) <= len(llm_response["brawlers_mentioned"])
 
+
+# pytest test/test.py -k test_prompt_prefix_is_stable
+def test_prompt_prefix_is_stable(llm_helper: LlmHelper):
+    """ The system prefix is identical across transcripts; only the user suffix changes. """
+    first = llm_helper.load_prompt_template(
+        prompt_name="YOUTUBE_VIDEO_BRIEF", transcript="uno", brawlers_list=get_brawlers_list()
+    )
+    second = llm_helper.load_prompt_template(
+        prompt_name="YOUTUBE_VIDEO_BRIEF", transcript="dos", brawlers_list=get_brawlers_list()
+    )
+    assert first[0].content == second[0].content
+    assert "uno" in first[-1].content and "dos" in second[-1].content
+
+    with pytest.raises(ValueError):
+        llm_helper.load_prompt_template(prompt_name="YOUTUBE_VIDEO_BRIEF", transcript="uno")
+
 @pytest.fixture(scope="module")
 def embed_model():
     return os.getenv("EMBED_MODEL_NAME", "text-embedding-005")
@@ -198,6 +228,231 @@ def test_query_rag_corpus(
     assert isinstance(response.text, str), "Response from RAG corpus should be a string."
     assert len(response.text) > 0, "Response from RAG corpus should not be empty."
 
+# pytest test/test.py -k test_query_router_filters
+def test_query_router_filters():
+    """ Brawler names, aliases and recency intent become retrieval filters. """
+    router = QueryRouter()
+    route = router.route("Is Grom strong in the current meta?", today=date(2025, 7, 10))
+
+    assert route["brawlers"] == ["Grom"]
+    assert route["recent"] is True
+    assert route["top_k"] < router.default_top_k
+    assert route["since_date"] == "2025-05-11"
+    assert route["metadata_filter"] == 'brawler in ("Grom")'
+
+    assert router.find_brawlers("Jesse o El Primo?") == ["Jessie", "El Primo"]
+    assert router.route("What is the best comp?")["metadata_filter"] == ""
+
+    # Nombres que también son palabras comunes no filtran sin mayúscula o contexto
+    assert router.find_brawlers("ban in ranked at max level") == []
+    assert router.find_brawlers("that spike in damage") == []
+    assert router.find_brawlers("mi primo dice que no") == []
+    assert router.find_brawlers("Is Max good?") == ["Max"]
+    assert router.find_brawlers("how to counter spike") == ["Spike"]
+    # Un alias de un nombre ambiguo identifica al brawler sin mayúscula
+    assert router.find_brawlers("Is Squeek strong?") == ["Squeak"]
+    assert router.find_brawlers("is squeek strong?") == ["Squeak"]
+
+# pytest test/test.py -k test_corpus_partitions
+def test_corpus_partitions():
+    """ Videos go to the partition of their publish-date window; old windows expire. """
+    name = corpus_partitions.partition_name("youtube_videos", "2025-07-10", months=2)
+    assert name == "youtube_videos_2025_07"
+    assert corpus_partitions.partition_name("youtube_videos", "2025-08-31", months=2) == name
+    assert corpus_partitions.partition_name("youtube_videos", "2025-07-10", months=0) == "youtube_videos"
+
+    start = corpus_partitions.parse_partition("youtube_videos", name)
+    assert start == date(2025, 7, 1)
+    assert corpus_partitions.parse_partition("youtube_videos", "test_corpus") is None
+
+    assert not corpus_partitions.is_expired(start, today=date(2026, 8, 31), months=2, retention_months=12)
+    assert corpus_partitions.is_expired(start, today=date(2026, 9, 1), months=2, retention_months=12)
+
+    # La partición nueva no alcanza sola hasta tener días y archivos suficientes
+    assert corpus_partitions.is_young(start, files=50, today=date(2025, 7, 10), min_days=14, min_files=20)
+    assert corpus_partitions.is_young(start, files=5, today=date(2025, 8, 20), min_days=14, min_files=20)
+    assert not corpus_partitions.is_young(start, files=50, today=date(2025, 8, 20), min_days=14, min_files=20)
+
+
+# pytest test/test.py -k test_single_flight_coalesces_calls
+def test_single_flight_coalesces_calls(tmp_path):
+    """ Concurrent calls for the same key run the function only once. """
+    single_flight = SingleFlightHelper(lock_dir=str(tmp_path))
+    calls = []
+    results = []
+
+    def slow_process():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"video_id": "abc"}
+
+    threads = [
+        threading.Thread(target=lambda: results.append(single_flight.do("abc", slow_process)))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert all(result == {"video_id": "abc"} for result, _ in results)
+    assert sum(shared for _, shared in results) == 4
+
+# pytest test/test.py -k test_single_flight_key_is_not_a_path
+def test_single_flight_key_is_not_a_path(tmp_path):
+    """ Keys taken from user URLs never become paths outside the lock dir. """
+    lock_dir = tmp_path / "locks"
+    single_flight = SingleFlightHelper(lock_dir=str(lock_dir))
+
+    result, _ = single_flight.do("../../escaped", lambda: {"ok": True})
+    assert result == {"ok": True}
+    assert not (tmp_path / "escaped.lock").exists()
+    assert all(p.parent == lock_dir for p in lock_dir.iterdir())
+
+    result, _ = single_flight.do("https://youtu.be/abc123", lambda: {"ok": True})
+    assert result == {"ok": True}
+
+# pytest test/test.py -k test_checkpoint_resume
+def test_checkpoint_resume(tmp_path):
+    """ Stages saved in a checkpoint are kept until the pipeline completes. """
+    checkpoints = CheckpointHelper("test", backend="local", local_dir=str(tmp_path))
+    checkpoint = checkpoints.new("abc", "https://www.youtube.com/watch?v=abc")
+    checkpoints.save_stage(checkpoint, "transcript", {"text": "hola"})
+    checkpoints.save_stage(checkpoint, "brief", {"summary": "resumen"})
+
+    loaded = checkpoints.load("abc")
+    assert list(loaded["stages"]) == ["transcript", "brief"]
+    assert [c["video_id"] for c in checkpoints.list_incomplete()] == ["abc"]
+
+    checkpoints.mark_completed(loaded)
+    assert checkpoints.list_incomplete() == []
+    assert CheckpointHelper("other", backend="local", local_dir=str(tmp_path)).load("abc") is None
+
+# pytest test/test.py -k test_dedup_detects_reupload
+def test_dedup_detects_reupload(tmp_path):
+    """ Re-uploads, clips and Shorts contained in an ingested transcript are found; unrelated text is not. """
+    with open("test/transcript.txt", "r", encoding="utf-8") as f:
+        transcript = f.read()
+    words = transcript.split()
+
+    index = ContainmentIndex(path=str(tmp_path / "index.jsonl"), threshold=0.8)
+    index.add("original", index.signature(transcript), llm_tokens=1000)
+
+    # Re-subida recortada, la segunda mitad como clip y un Short de 150 palabras
+    for clip in (words[len(words) // 20:], words[len(words) // 2:], words[3000:3150]):
+        match = index.query(index.signature(" ".join(clip)))
+        assert match is not None
+        assert match["video_id"] == "original"
+        assert match["llm_tokens"] == 1000
+    assert index.query(index.signature(" ".join(reversed(words)))) is None
+
+    # El índice se recarga desde el log en disco
+    assert len(ContainmentIndex(path=str(tmp_path / "index.jsonl"), threshold=0.8)) == 1
+
+    # Entradas agregadas por otro worker se ven en la siguiente consulta
+    other = ContainmentIndex(path=str(tmp_path / "index.jsonl"), threshold=0.8)
+    index.add("reversed", index.signature(" ".join(reversed(words))))
+    assert other.query(other.signature(" ".join(reversed(words))))["video_id"] == "reversed"
+
+    # Transcripts vacíos o muy cortos no se indexan ni coinciden entre sí
+    assert index.signature("... !!!") == []
+    index.add("empty", index.signature(""))
+    assert index.query(index.signature("?")) is None
+
+# pytest test/test.py -k test_chunk_hashes_skip_imported_text
+def test_chunk_hashes_skip_imported_text(tmp_path):
+    """ Chunks already imported into a partition are not uploaded again. """
+    index = ChunkHashIndex(backend="local", local_dir=str(tmp_path))
+    chunks = utils.process_video_dict(
+        {"summary": "s", "brawlers_mentioned": [{"name": "Grom", "relevant_tips_or_strategies": "t"}]},
+        file_id="original", publish_date="2025-07-10"
+    )
+    assert index.new_chunks("youtube_videos_2025_07", chunks) == chunks
+    index.mark_imported("youtube_videos_2025_07", chunks)
+
+    # Re-subida con el brief reutilizado: mismo texto, otro id
+    reupload = utils.process_video_dict(
+        {"summary": "s", "brawlers_mentioned": [{"name": "Grom", "relevant_tips_or_strategies": "t"}]},
+        file_id="reupload", publish_date="2025-07-12"
+    )
+    assert index.new_chunks("youtube_videos_2025_07", reupload) == []
+    assert len(index.new_chunks("youtube_videos_2025_09", reupload)) == 2
+
+# pytest test/test.py -k test_brawler_aggregate_answers
+def test_brawler_aggregate_answers(tmp_path):
+    """ Common per-brawler questions are answered from the aggregate view. """
+    with open("test/llm_response.txt", "r", encoding="utf-8") as f:
+        brief = json.load(f)
+    # tier / sentiment como los devuelve el brief estructurado
+    signals = {"Grom": ("F", "negative"), "Chuck": ("D", "negative"), "Emz": ("A", "negative"), "Rosa": ("", "negative")}
+    for b in brief["brawlers_mentioned"]:
+        b["tier"], b["sentiment"] = signals.get(b["name"], ("", "neutral"))
+
+    aggregates = BrawlerAggregateHelper(path=str(tmp_path / "aggregates.json"), backend="local")
+    assert aggregates.add_video("4H9i-VC1adM", "2025-07-10", brief) is True
+    assert aggregates.add_video("4H9i-VC1adM", "2025-07-10", brief) is False
+
+    answer = aggregates.answer("Is Grom strong in the current meta?", today=date(2025, 7, 20))
+    assert answer["intent"] == "strength"
+    assert answer["verdict"] == "weak"
+    assert answer["tier_score"] == 0
+    assert answer["sources"][0]["video_id"] == "4H9i-VC1adM"
+    assert aggregates.answer("Is Chuck strong?", today=date(2025, 7, 20))["verdict"] == "weak"
+
+    # Sin tier, o con opinión que contradice el tier, la pregunta va por RAG
+    assert aggregates.answer("Is Rosa strong?", today=date(2025, 7, 20)) is None
+    assert aggregates.lookup("Emz", today=date(2025, 7, 20))["verdict"] == "conflicting"
+    assert aggregates.answer("Is Emz good?", today=date(2025, 7, 20)) is None
+
+    # Preguntas abiertas o de varios brawlers van por RAG
+    assert aggregates.answer("What is the best comp for Gem Grab?") is None
+    assert aggregates.answer("Grom or Draco?") is None
+    assert aggregates.answer("Why is Grom not good anymore?") is None
+    assert aggregates.answer("What's Grom's role in the meta and why did the buff matter?") is None
+    assert aggregates.answer("how to play grom?", today=date(2025, 7, 20))["intent"] == "tips"
+
+# pytest test/test.py -k test_merge_sharded_analysis
+def test_merge_sharded_analysis():
+    """ Shards of a long transcript overlap and their partial results merge deterministically. """
+    with open("test/transcript.txt", "r", encoding="utf-8") as f:
+        transcript = f.read()
+    shards = utils.split_transcript(transcript, max_chars=8000)
+    assert len(shards) > 1
+    assert all(len(shard) <= 8000 for shard in shards)
+    # El overlap se limita a max_chars // 4: no explota la cantidad de partes
+    assert len(utils.split_transcript(transcript, max_chars=100)) < len(transcript) / 50
+
+    first = {
+        "summary": "Tier list part one.",
+        "key_topics": ["Tier list", "Hypercharges"],
+        "brawlers_mentioned": [
+            {"name": "Grom", "context_in_transcript": "F tier.", "relevant_tips_or_strategies": "Avoid."}
+        ],
+        "meta_notes": "Hypercharges matter.",
+    }
+    second = {
+        "summary": "Tier list part two.",
+        "key_topics": ["tier list", "Draco"],
+        "brawlers_mentioned": [
+            {"name": "Draco", "context_in_transcript": "S tier.", "relevant_tips_or_strategies": "Pick him."},
+            {"name": "Grom", "context_in_transcript": "Still bad.", "relevant_tips_or_strategies": "Avoid."},
+        ],
+        "meta_notes": "Hypercharges matter.",
+    }
+    merged = utils.merge_analysis_results([first, second])
+
+    assert [b["name"] for b in merged["brawlers_mentioned"]] == ["Grom", "Draco"]
+    assert merged["brawlers_mentioned"][0]["context_in_transcript"] == "F tier. Still bad."
+    assert merged["brawlers_mentioned"][0]["relevant_tips_or_strategies"] == "Avoid."
+    assert merged["key_topics"] == ["Tier list", "Hypercharges", "Draco"]
+    assert merged["summary"] == "Tier list part one. Tier list part two."
+    # Summaries largos se recortan para que el total no pase de 100 palabras
+    long = [{"summary": "First sentence here. " + "word " * 120}, {"summary": "Second part. " + "word " * 120}]
+    assert len(utils.merge_analysis_results(long)["summary"].split()) <= 100
+    assert utils.merge_analysis_results(long)["summary"] == "First sentence here. Second part."
+    assert merged["meta_notes"] == "Hypercharges matter."
+    assert utils.merge_analysis_results([second, first]) != merged
 
 
 # RagManagedDb 
@@ -0,0 +1,46 @@
+import os
+import threading
+from langfuse import Langfuse
+
+_lock = threading.Lock()
+_client: Langfuse | None = None
+
+# Cola acotada del BatchSpanProcessor: si se llena, los spans nuevos se descartan
+# en lugar de bloquear el request.
+os.environ.setdefault("OTEL_BSP_MAX_QUEUE_SIZE", os.getenv("LANGFUSE_MAX_QUEUE_SIZE", "2048"))
+
+
+def get_langfuse() -> Langfuse:
+    """
+    Shared Langfuse client for queries and the ingestion pipeline.
+
+    Spans are buffered in a bounded in-memory queue and exported in batches by
+    a background thread, every LANGFUSE_FLUSH_INTERVAL seconds or as soon as
+    LANGFUSE_FLUSH_AT spans are queued, so requests never wait on the network.
+    LANGFUSE_SAMPLE_RATE applies head-based sampling per trace (1.0 = all).
+
+    Returns:
+        Langfuse: The process-wide client (also returned by `get_client()`).
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            _client = Langfuse(
+                secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
+                public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
+                host=os.getenv("LANGFUSE_HOST"),
+                environment=os.getenv("LANGFUSE_TRACING_ENVIRONMENT"),
+                sample_rate=float(os.getenv("LANGFUSE_SAMPLE_RATE", "1.0")),
+                flush_at=int(os.getenv("LANGFUSE_FLUSH_AT", "64")),
+                flush_interval=float(os.getenv("LANGFUSE_FLUSH_INTERVAL", "5")),
+            )
+        return _client
+
+
+def shutdown() -> None:
+    """ Flush pending spans and stop the exporter (gunicorn worker exit). """
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.shutdown()
+            _client = None
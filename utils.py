@@ -60,4 +60,100 @@ def save_chunks_to_jsonl(chunks: list, file_name: str = ""):
                 "id": c["id"],
                 "text": c["text"],
                 "restricts": c["restricts"]
-            })
\ No newline at end of file
+            })
+
+def split_transcript(text: str, max_chars: int, overlap: int = 200) -> list:
+    """ Split a transcript into windows of at most `max_chars`, cut on whitespace.
+    Consecutive windows share `overlap` characters (at most a quarter of `max_chars`)
+    so a brawler discussed across a boundary still appears complete in one of them. """
+    if len(text) <= max_chars:
+        return [text]
+    overlap = min(overlap, max_chars // 4)
+    shards, start = [], 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", start + max_chars // 2, end)
+            end = cut if cut != -1 else end
+        shards.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        # Empieza la ventana siguiente en un límite de palabra
+        space = text.find(" ", start, end)
+        start = space + 1 if space != -1 else start
+    return shards
+
+
+def _unique(parts: list) -> list:
+    """ Non-empty parts without case-insensitive repeats, in their original order. """
+    seen, out = set(), []
+    for p in parts:
+        p = (p or "").strip()
+        if p and p.lower() not in seen:
+            seen.add(p.lower())
+            out.append(p)
+    return out
+
+
+def _bounded_join(parts: list, max_words: int = 100) -> str:
+    """ Join texts within `max_words` (the prompt's summary limit): each part keeps an equal
+    share of words, cut at its last full sentence when there is one. """
+    parts = _unique(parts)
+    if not parts:
+        return ""
+    share = max(max_words // len(parts), 1)
+    out = []
+    for p in parts:
+        words = p.split()
+        if len(words) <= share:
+            out.append(p)
+            continue
+        head = " ".join(words[:share])
+        end = head.rfind(". ")
+        out.append(head[:end + 1] if end != -1 else head + "…")
+    return " ".join(out)
+
+
+def _merge_sentiment(sentiments: list) -> str:
+    """ One sentiment for a brawler seen in several shards: the common non-neutral value, else "mixed". """
+    opinions = {s.lower() for s in _unique(sentiments) if s.lower() != "neutral"}
+    if not opinions:
+        return "neutral"
+    return opinions.pop() if len(opinions) == 1 else "mixed"
+
+
+def merge_analysis_results(results: list) -> dict:
+    """ Deterministically merge partial TranscriptAnalysisResult dicts (one per shard, in
+    transcript order): brawlers deduped by name with their context and tips concatenated
+    and their first stated tier, key topics deduped, meta notes reduced to their unique
+    parts. The shard summaries are reduced to one summary of at most 100 words that
+    covers every shard (see _bounded_join). """
+    brawlers = {}
+    for r in results:
+        for b in r.get("brawlers_mentioned", []):
+            key = b.get("name", "").strip().lower()
+            entry = brawlers.setdefault(
+                key, {"name": b.get("name"), "context": [], "tips": [], "tiers": [], "sentiments": []}
+            )
+            entry["context"].append(b.get("context_in_transcript"))
+            entry["tips"].append(b.get("relevant_tips_or_strategies"))
+            entry["tiers"].append(b.get("tier"))
+            entry["sentiments"].append(b.get("sentiment"))
+
+    return {
+        "summary": _bounded_join([r.get("summary") for r in results]),
+        "key_topics": _unique([t for r in results for t in r.get("key_topics", [])]),
+        "brawlers_mentioned": [
+            {
+                "name": e["name"],
+                "context_in_transcript": " ".join(_unique(e["context"])),
+                "relevant_tips_or_strategies": " ".join(_unique(e["tips"])),
+                # El primer tier explícito; opiniones distintas entre partes quedan como "mixed"
+                "tier": (_unique(e["tiers"]) or [""])[0],
+                "sentiment": _merge_sentiment(e["sentiments"]),
+            }
+            for e in brawlers.values()
+        ],
+        "meta_notes": " ".join(_unique([r.get("meta_notes") for r in results])),
+    }
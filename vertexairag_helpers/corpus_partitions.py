@@ -0,0 +1,65 @@
+import os
+import re
+from datetime import date
+
+# Meses por partición (las temporadas de Brawl Stars duran ~2 meses). 0 = un solo corpus.
+PARTITION_MONTHS = int(os.getenv("CORPUS_PARTITION_MONTHS", "2"))
+# Meses que se conservan; las particiones más viejas se archivan o se borran
+RETENTION_MONTHS = int(os.getenv("CORPUS_RETENTION_MONTHS", "12"))
+# "archive": borra el corpus pero conserva los JSONL en GCS, "drop": borra ambos
+RETENTION_POLICY = os.getenv("CORPUS_RETENTION_POLICY", "archive")
+# Mientras la partición más nueva tenga menos días o archivos, se consulta también la anterior
+PARTITION_MIN_DAYS = int(os.getenv("CORPUS_PARTITION_MIN_DAYS", "14"))
+PARTITION_MIN_FILES = int(os.getenv("CORPUS_PARTITION_MIN_FILES", "20"))
+
+
+def _month_index(d: date) -> int:
+    return d.year * 12 + d.month - 1
+
+
+def window_start(publish_date: str, months: int = PARTITION_MONTHS) -> date:
+    """ First day of the publish-date window a video belongs to. """
+    d = date.fromisoformat(publish_date) if publish_date else date.today()
+    idx = _month_index(d) // months * months
+    return date(idx // 12, idx % 12 + 1, 1)
+
+
+def partition_name(base: str, publish_date: str, months: int = PARTITION_MONTHS) -> str:
+    """
+    Display name of the corpus partition for a publish date.
+
+    Args:
+        base (str): Base corpus display name (e.g. "youtube_videos").
+        publish_date (str): Publish date (YYYY-MM-DD); empty means today.
+        months (int): Window size in months. 0 disables partitioning.
+
+    Returns:
+        str: e.g. "youtube_videos_2025_07" for a 2-month window starting in July.
+    """
+    if months <= 0:
+        return base
+    start = window_start(publish_date, months)
+    return f"{base}_{start.year}_{start.month:02d}"
+
+
+def parse_partition(base: str, display_name: str) -> date | None:
+    """ Window start of a partition display name, or None if it is not a partition of `base`. """
+    match = re.fullmatch(rf"{re.escape(base)}_(\d{{4}})_(\d{{2}})", display_name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def is_expired(start: date, today: date = None, months: int = PARTITION_MONTHS,
+               retention_months: int = RETENTION_MONTHS) -> bool:
+    """ True if the whole window ended more than `retention_months` ago. """
+    today = today or date.today()
+    window_end = _month_index(start) + months
+    return _month_index(today) - window_end >= retention_months
+
+
+def is_young(start: date, files: int, today: date = None, min_days: int = PARTITION_MIN_DAYS,
+             min_files: int = PARTITION_MIN_FILES) -> bool:
+    """ True while a partition is too new or too small to answer on its own. """
+    today = today or date.today()
+    return (today - start).days < min_days or files < min_files
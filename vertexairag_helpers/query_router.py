@@ -0,0 +1,146 @@
+import os
+import re
+from datetime import date, timedelta
+from typing_extensions import TypedDict, List
+from llm_helpers.brawlers_data import BRAWLERS_LIST, BRAWLER_ALIASES, AMBIGUOUS_BRAWLER_NAMES
+
+
+# Frases que indican que la pregunta es sobre el meta actual (EN / ES / PT)
+RECENCY_PATTERNS = [
+    r"current meta",
+    r"this season",
+    r"right now",
+    r"\bnow\b",
+    r"\blatest\b",
+    r"\bcurrently\b",
+    r"\bnowadays\b",
+    r"meta actual",
+    r"\bactualmente\b",
+    r"esta temporada",
+    r"\bahora\b",
+    r"\batual\b",
+    r"\bagora\b",
+]
+
+# Contexto de juego que confirma un nombre ambiguo escrito en minúscula ("max gadget", "counter spike")
+CONTEXT_AFTER = r"\s+(gadgets?|star ?powers?|hypercharges?|builds?|mains?|brawler)\b"
+CONTEXT_BEFORE = r"\b(play|playing|main|maining|counter|counters|vs|against|contra|jugar con|juego con)\s+"
+
+
+class QueryRoute(TypedDict):
+    brawlers: List[str]
+    recent: bool
+    since_date: str
+    top_k: int
+    metadata_filter: str
+
+
+def _normalize(text: str) -> str:
+    text = text.lower().replace("&", " and ")
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return f" {text.strip()} "
+
+
+class QueryRouter:
+    """
+    Derives retrieval filters from a user query before hitting the RAG corpus.
+
+    Detects brawler names (official list plus aliases) and recency intent
+    ("current meta", "this season", ...). Brawlers become a metadata filter
+    over the `brawler` namespace written by `utils.process_video_dict`,
+    together with a smaller top-k. Names that are also common words (see
+    AMBIGUOUS_BRAWLER_NAMES) only count when capitalised or next to game
+    context, so "max level" or "a spike in damage" do not filter retrieval.
+
+    `publish_date` is a categorical restrict, so recency is not part of the
+    filter: it is returned as `since_date` for the aggregate view, and the
+    time partitions of the corpus keep retrieval recent.
+    """
+
+    default_top_k = int(os.getenv("RAG_TOP_K", "10"))
+    brawler_top_k = int(os.getenv("RAG_BRAWLER_TOP_K", "3"))
+    recent_days = int(os.getenv("RAG_RECENT_DAYS", "60"))
+
+    def __init__(self) -> None:
+        names = {_normalize(name): name for name in BRAWLERS_LIST}
+        names.update({_normalize(alias): name for alias, name in BRAWLER_ALIASES.items()})
+        # Nombres más largos primero para que "El Primo" gane sobre "Primo"
+        self._names = sorted(names.items(), key=lambda item: len(item[0]), reverse=True)
+        self._recency = re.compile("|".join(RECENCY_PATTERNS), re.IGNORECASE)
+
+    def find_brawlers(self, query: str) -> list[str]:
+        """
+        Find the official brawler names mentioned in a query.
+
+        Args:
+            query (str): The user query.
+
+        Returns:
+            list: Official brawler names, in order of first appearance.
+        """
+        text = _normalize(query)
+        found = []
+        for needle, name in self._names:
+            pos = text.find(needle)
+            if pos == -1:
+                continue
+            # Evita contar dos veces el mismo tramo ("el primo" y "primo")
+            text = text[:pos] + " " * len(needle) + text[pos + len(needle):]
+            # Solo el nombre oficial es ambiguo: un alias ("squeek") ya identifica al brawler
+            if (name in AMBIGUOUS_BRAWLER_NAMES and needle == _normalize(name)
+                    and not self._is_brawler_mention(query, name)):
+                continue
+            if name not in (n for _, n in found):
+                found.append((pos, name))
+        return [name for _, name in sorted(found)]
+
+    def is_recent(self, query: str) -> bool:
+        """ True if the query asks about the current meta / season. """
+        return bool(self._recency.search(query))
+
+    def route(self, query: str, today: date | None = None) -> QueryRoute:
+        """
+        Build the retrieval filters for a query.
+
+        Args:
+            query (str): The user query.
+            today (date, optional): Reference date for recency windows.
+
+        Returns:
+            QueryRoute: Detected brawlers, recency window, top-k and the
+            brawler metadata filter expression ("" if no brawler was found).
+        """
+        brawlers = self.find_brawlers(query)
+        recent = self.is_recent(query)
+        since_date = ""
+        if recent:
+            since_date = ((today or date.today()) - timedelta(days=self.recent_days)).isoformat()
+
+        metadata_filter = ""
+        if brawlers:
+            allowed = ", ".join(f'"{name}"' for name in brawlers)
+            metadata_filter = f"brawler in ({allowed})"
+
+        top_k = self.default_top_k
+        if brawlers:
+            top_k = min(self.default_top_k, self.brawler_top_k * len(brawlers))
+
+        return {
+            "brawlers": brawlers,
+            "recent": recent,
+            "since_date": since_date,
+            "top_k": top_k,
+            "metadata_filter": metadata_filter,
+        }
+
+    # --- Helpers privados ---
+    @staticmethod
+    def _is_brawler_mention(query: str, name: str) -> bool:
+        # Capitalizado ("Max", "MAX") o con contexto de juego ("max gadget", "counter spike")
+        if re.search(rf"(?<![A-Za-z]){re.escape(name[0].upper())}(?i:{re.escape(name[1:])})(?![A-Za-z])", query):
+            return True
+        word = re.escape(name.lower())
+        return bool(
+            re.search(rf"\b{word}{CONTEXT_AFTER}", query, re.IGNORECASE)
+            or re.search(rf"{CONTEXT_BEFORE}{word}\b", query, re.IGNORECASE)
+        )
@@ -1,13 +1,31 @@
 import os
+import re
+import time
+import threading
+from datetime import date
+from itertools import zip_longest
 from dotenv import load_dotenv
 import vertexai
 from vertexai import rag
 from vertexai.generative_models import GenerativeModel, Tool
-from vertexai.language_models import TextEmbeddingInput, TextEmbeddingModel
 from google.cloud import aiplatform
 from google.api_core import operation_async
 from vertexai.generative_models import GenerationResponse
-from langfuse import Langfuse, observe, get_client
+from langfuse import observe
+from tracing_helpers import tracing_helper
+from .query_router import QueryRouter
+from . import corpus_partitions
+
+
+# Prompt para responder con contextos recuperados de varias particiones
+RAG_CONTEXT_PROMPT = """Answer the question about Brawl Stars using only the context below, taken from
+YouTube videos of professional players. If the context does not answer it, say so.
+
+Context:
+{context}
+
+Question: {query}
+"""
 
 
 # Cargar variables desde .env
@@ -21,22 +39,37 @@ class VertexAIRagHelper:
     """
 
     project_id = os.getenv("PROJECT_ID", "bs-ranked")
+    partitions_ttl = float(os.getenv("CORPUS_PARTITIONS_TTL", "300"))
+    # Segundos que otra instancia espera a que se cree un corpus con lock tomado
+    corpus_create_timeout = float(os.getenv("CORPUS_CREATE_TIMEOUT", "120"))
+    corpus_locks_prefix = "corpus_locks"
     location = os.getenv("VERTEX_REGION", "us-central1")
     embed_model = os.getenv("EMBED_MODEL_NAME", "text-embedding-005")
     model_name = os.getenv("VERTEX_MODEL_NAME", "gemini-2.0-flash-lite")
     temperature = float(os.getenv("VERTEX_TEMPERATURE", "0.0"))
     max_output_tokens = int(os.getenv("VERTEX_MAX_OUTPUT_TOKENS", "256"))
+    # Segundos máximos de espera por una operación de importación
+    import_timeout = float(os.getenv("RAG_IMPORT_TIMEOUT", "600"))
+    # Filtros de QueryRouter en la recuperación (off por defecto, ver query_rag_corpus)
+    routed = os.getenv("RAG_ROUTED", "false").lower() == "true"
 
-    def __init__(self, project_id: str = None) -> None:
+    def __init__(self, project_id: str = None, gcs_helper=None) -> None:
         vertexai.init(project=project_id, location=self.location)
         aiplatform.init(project="bs-ranked")
+        # Con un GCSHelper, la creación de corpus se coordina entre instancias
+        self.gcs_helper = gcs_helper
         
-        self.langfuse = Langfuse(
-            secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
-            public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
-            host=os.getenv("LANGFUSE_HOST"),
-            environment=os.getenv("LANGFUSE_TRACING_ENVIRONMENT"),
-        )
+        # Cliente compartido: exporta en segundo plano, sin flush por request
+        self.langfuse = tracing_helper.get_langfuse()
+
+        self.query_router = QueryRouter()
+        # Caché de corpus / particiones ya resueltos: display_name -> RagCorpus
+        self._corpora_lock = threading.Lock()
+        self._corpora: dict[str, rag.RagCorpus] = {}
+        # Lista de particiones por base, para no listar corpus en cada consulta
+        self._partition_lists: dict[str, tuple[float, list]] = {}
+        # Cantidad de archivos por partición (solo de la más reciente)
+        self._file_counts: dict[str, tuple[float, int]] = {}
 
         
     def list_files(self, corpus_name: str) -> list | None:
@@ -110,6 +143,142 @@ class VertexAIRagHelper:
             )
         )
 
+    def list_partitions(self, base: str) -> list[tuple[date, rag.RagCorpus]]:
+        """
+        List the time partitions of a corpus, newest first.
+
+        Args:
+            base (str): Base corpus display name.
+
+        Returns:
+            list: (window start, RagCorpus) tuples.
+        """
+        partitions = []
+        for corpus in self.list_rag_corpora():
+            start = corpus_partitions.parse_partition(base, corpus.display_name)
+            if start is not None:
+                partitions.append((start, corpus))
+        return sorted(partitions, key=lambda p: p[0], reverse=True)
+
+    def get_or_create_corpus(self, display_name: str, embed_model: str) -> rag.RagCorpus:
+        """
+        Get a RAG corpus by display name, creating it if it does not exist.
+        Resolved corpora are cached for the lifetime of the helper.
+
+        With a GCSHelper, creation takes a lock object in the bucket
+        (`corpus_locks/<display_name>`, created only if absent), so two workers
+        or instances ingesting the first video of a window never create two
+        corpora with the same display name: the others wait for the corpus.
+
+        Args:
+            display_name (str): The display name of the RAG corpus.
+            embed_model (str): Embedding model used if the corpus is created.
+
+        Returns:
+            rag.RagCorpus: The RAG corpus.
+        """
+        with self._corpora_lock:
+            corpus = self._corpora.get(display_name)
+            if corpus is None:
+                corpus = self.get_rag_corpus_display_name(display_name)
+                if corpus is None:
+                    corpus = self._create_corpus_once(display_name, embed_model)
+                self._corpora[display_name] = corpus
+            return corpus
+
+    def _create_corpus_once(self, display_name: str, embed_model: str) -> rag.RagCorpus:
+        if self.gcs_helper is None:
+            return self.create_rag_storage_corpus(display_name, embed_model)
+
+        lock_path = f"{self.corpus_locks_prefix}/{display_name}"
+        for _ in range(2):
+            if self.gcs_helper.create_if_absent(lock_path, display_name):
+                try:
+                    # Relee por si otra instancia lo creó y ya liberó su lock
+                    corpus = self.get_rag_corpus_display_name(display_name)
+                    return corpus or self.create_rag_storage_corpus(display_name, embed_model)
+                finally:
+                    self.gcs_helper.delete_if_older(lock_path, 0)
+
+            # Otra instancia lo está creando: espera a que aparezca
+            deadline = time.time() + self.corpus_create_timeout
+            while time.time() < deadline:
+                corpus = self.get_rag_corpus_display_name(display_name)
+                if corpus is not None:
+                    return corpus
+                time.sleep(2)
+            # Lock viejo de una instancia que murió antes de crear el corpus
+            self.gcs_helper.delete_if_older(lock_path, self.corpus_create_timeout)
+        raise RuntimeError(f"Timed out waiting for RAG corpus {display_name} to be created")
+
+    def select_partitions(self, base: str, query: str, today: date = None) -> list[str]:
+        """
+        Pick the partitions a query should search.
+
+        Queries go to the newest partition by default ("current meta"). While
+        the newest partition is young (its window started less than
+        CORPUS_PARTITION_MIN_DAYS ago, or it holds fewer than
+        CORPUS_PARTITION_MIN_FILES files), the previous partition is searched
+        too, so a new window does not hide last week's videos. A query that
+        names an earlier year goes to the newest partition of that year.
+        Falls back to the unpartitioned corpus if there are no partitions.
+
+        Args:
+            base (str): Base corpus display name.
+            query (str): The user query.
+            today (date, optional): Reference date for the partition age.
+
+        Returns:
+            list: Display names of the corpora to query, newest first.
+        """
+        partitions = self._cached_partitions(base)
+        if not partitions:
+            return [base]
+
+        years = {int(y) for y in re.findall(r"\b(20\d{2})\b", query)}
+        if years and not self.query_router.is_recent(query):
+            for start, corpus in partitions:
+                if start.year in years:
+                    return [corpus.display_name]
+
+        newest_start, newest = partitions[0]
+        names = [newest.display_name]
+        if len(partitions) > 1 and corpus_partitions.is_young(newest_start, self._file_count(newest), today=today):
+            names.append(partitions[1][1].display_name)
+        return names
+
+    def prune_partitions(self, base: str, policy: str = corpus_partitions.RETENTION_POLICY,
+                         gcs_helper=None, today: date = None) -> list[str]:
+        """
+        Apply the retention policy to the partitions of a corpus.
+
+        Expired partitions (see CORPUS_RETENTION_MONTHS) are deleted from RAG
+        Engine. With policy "archive" their chunk files stay in GCS under
+        rag_upload/<partition>/ so they can be re-imported; with "drop" the
+        files are deleted too.
+
+        Args:
+            base (str): Base corpus display name.
+            policy (str): "archive" or "drop".
+            gcs_helper (GCSHelper, optional): Required to drop the GCS files.
+            today (date, optional): Reference date.
+
+        Returns:
+            list: Display names of the removed partitions.
+        """
+        removed = []
+        for start, corpus in self.list_partitions(base):
+            if not corpus_partitions.is_expired(start, today=today):
+                continue
+            rag.delete_corpus(name=corpus.name)
+            if policy == "drop" and gcs_helper is not None:
+                gcs_helper.delete_prefix(f"rag_upload/{corpus.display_name}/")
+            with self._corpora_lock:
+                self._corpora.pop(corpus.display_name, None)
+            removed.append(corpus.display_name)
+        self._partition_lists.pop(base, None)
+        return removed
+
     async def import_files_async(self, corpus_name: str, gcs_path: str) -> operation_async.AsyncOperation:
         """ Import chunks into a RAG corpus from a GCS path.
         Args:
@@ -130,14 +299,46 @@ class VertexAIRagHelper:
         )
 
 
+    async def import_files_and_wait(self, corpus_name: str, gcs_path: str) -> tuple[str, dict]:
+        """ Import chunks into a RAG corpus and wait until the import operation finishes.
+
+        Args:
+            corpus_name (str): The resource name of the RAG corpus.
+            gcs_path (str): The GCS path where the chunks are stored.
+
+        Returns:
+            tuple: (operation name, counts of imported / skipped / failed files).
+
+        Raises:
+            RuntimeError: If any file failed to import.
+        """
+        operation = await self.import_files_async(corpus_name=corpus_name, gcs_path=gcs_path)
+        response = await operation.result(timeout=self.import_timeout)
+        counts = {
+            "imported": response.imported_rag_files_count,
+            "skipped": response.skipped_rag_files_count,
+            "failed": response.failed_rag_files_count,
+        }
+        if counts["failed"]:
+            raise RuntimeError(f"RAG import of {gcs_path} failed for {counts['failed']} file(s)")
+        return operation.operation.name, counts
+
     @observe(as_type="generation")
-    def query_rag_corpus(self, corpus_display_name: str, query: str) -> GenerationResponse:
+    def query_rag_corpus(self, corpus_display_name: str, query: str, routed: bool = None) -> GenerationResponse:
         """
         Query the RAG corpus with a text query.
 
+        With routing, brawler names found in the query are turned into a
+        metadata filter and a smaller top-k before retrieval (see QueryRouter).
+        If the filtered retrieval grounds nothing, the query is retried over
+        the whole corpus with the default top-k.
+
         Args:
             corpus_display_name (str): The display name of the RAG corpus.
             query (str): The text query to search in the RAG corpus.
+            routed (bool, optional): Derive retrieval filters from the query.
+                Defaults to RAG_ROUTED (off until routed / unrouted latency and
+                token numbers from the Langfuse generations justify it).
         
         Returns:
             str: The response from the RAG corpus.
@@ -147,16 +348,151 @@ class VertexAIRagHelper:
         rag_corpus = self.get_rag_corpus_display_name(corpus_display_name)
         if rag_corpus is None:
             raise ValueError("RAG corpus not found.")
+        routed = self.routed if routed is None else routed
+
+        # Derive the brawler filter and top-k from the query
+        route = self.query_router.route(query) if routed else None
+        start = time.perf_counter()
+        if route and route["metadata_filter"]:
+            response = self._generate(rag_corpus, query, route["top_k"], route["metadata_filter"])
+            # Sin contexto recuperado con el filtro: reintenta sobre todo el corpus
+            fallback = self._grounding_chunks_count(response) == 0
+            if fallback:
+                response = self._generate(rag_corpus, query, self.query_router.default_top_k)
+        else:
+            fallback = False
+            response = self._generate(rag_corpus, query, self.query_router.default_top_k)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        # Record latency and input tokens so routed / unrouted queries can be compared
+        usage = response.usage_metadata
+        self.langfuse.update_current_generation(
+            model=self.model_name,
+            usage_details={
+                "input": usage.prompt_token_count,
+                "output": usage.candidates_token_count,
+            },
+            metadata={
+                "routed": routed,
+                "route": route,
+                "unfiltered_fallback": fallback,
+                "latency_ms": round(elapsed_ms, 1),
+            },
+        )
+
+        return response
+
+    @observe(as_type="generation")
+    def query_rag_partitions(self, display_names: list[str], query: str, routed: bool = None) -> GenerationResponse:
+        """
+        Query several RAG corpora (time partitions) with a text query.
+
+        A retrieval tool accepts a single corpus, so the contexts of each
+        corpus are retrieved separately, interleaved by rank (newest partition
+        first) up to top-k, and passed to Gemini in the prompt. For a single
+        corpus use `query_rag_corpus`, which grounds with the retrieval tool.
+
+        Args:
+            display_names (list): Display names of the corpora, newest first.
+            query (str): The text query.
+            routed (bool, optional): Derive retrieval filters from the query
+                (defaults to RAG_ROUTED, see query_rag_corpus).
+
+        Returns:
+            GenerationResponse: The response grounded on the merged contexts.
+        """
+        corpora = [self.get_rag_corpus_display_name(name) for name in display_names]
+        corpora = [c for c in corpora if c is not None]
+        if not corpora:
+            raise ValueError("RAG corpus not found.")
+        routed = self.routed if routed is None else routed
+        route = self.query_router.route(query) if routed else None
+
+        start = time.perf_counter()
+        contexts, fallback = [], False
+        if route and route["metadata_filter"]:
+            contexts = self._retrieve_merged(corpora, query, route["top_k"], route["metadata_filter"])
+            # Sin contexto recuperado con el filtro: reintenta sin filtro
+            fallback = not contexts
+        if not contexts:
+            contexts = self._retrieve_merged(corpora, query, self.query_router.default_top_k)
+
+        response = GenerativeModel(model_name=self.model_name).generate_content(
+            RAG_CONTEXT_PROMPT.format(context="\n\n".join(contexts), query=query),
+            generation_config={
+                "temperature": self.temperature,
+                "max_output_tokens": self.max_output_tokens
+            }
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        usage = response.usage_metadata
+        self.langfuse.update_current_generation(
+            model=self.model_name,
+            usage_details={
+                "input": usage.prompt_token_count,
+                "output": usage.candidates_token_count,
+            },
+            metadata={
+                "partitions": [c.display_name for c in corpora],
+                "contexts": len(contexts),
+                "routed": routed,
+                "route": route,
+                "unfiltered_fallback": fallback,
+                "latency_ms": round(elapsed_ms, 1),
+            },
+        )
+        return response
+
+    # --- Helpers privados ---
+    def _retrieve_merged(self, corpora: list, query: str, top_k: int, metadata_filter: str = "") -> list[str]:
+        retrieval_config = rag.RagRetrievalConfig(
+            top_k=top_k,
+            filter=rag.Filter(metadata_filter=metadata_filter) if metadata_filter else None,
+        )
+        ranked = []
+        for corpus in corpora:
+            response = rag.retrieval_query(
+                text=query,
+                rag_resources=[rag.RagResource(rag_corpus=corpus.name)],
+                rag_retrieval_config=retrieval_config,
+            )
+            ranked.append([c.text for c in response.contexts.contexts])
+        # Intercala por ranking: el 1ro de cada partición, luego el 2do, ...
+        merged = [text for group in zip_longest(*ranked) for text in group if text]
+        return merged[:top_k]
+
+    def _cached_partitions(self, base: str) -> list:
+        cached = self._partition_lists.get(base)
+        if cached is None or time.time() - cached[0] > self.partitions_ttl:
+            cached = (time.time(), self.list_partitions(base))
+            self._partition_lists[base] = cached
+        return cached[1]
+
+    def _file_count(self, corpus: rag.RagCorpus) -> int:
+        cached = self._file_counts.get(corpus.name)
+        if cached is None or time.time() - cached[0] > self.partitions_ttl:
+            cached = (time.time(), sum(1 for _ in self.list_files(corpus.name)))
+            self._file_counts[corpus.name] = cached
+        return cached[1]
+
+    def _generate(self, rag_corpus: rag.RagCorpus, query: str, top_k: int,
+                  metadata_filter: str = "") -> GenerationResponse:
         # Create a RagResource for the corpus
         rag_resource = rag.RagResource(
             rag_corpus=rag_corpus.name,
         )
+        retrieval_config = rag.RagRetrievalConfig(
+            top_k=top_k,
+            filter=rag.Filter(metadata_filter=metadata_filter) if metadata_filter else None,
+        )
         # Create a retrieval tool from the RagResource
         rag_retrieval_tool = Tool.from_retrieval(
             retrieval=rag.Retrieval(
                 source=rag.VertexRagStore(
                     # Currently only 1 corpus is allowed.
                     rag_resources=[rag_resource],
+                    rag_retrieval_config=retrieval_config,
                 ),
             )
         )
@@ -168,7 +504,7 @@ class VertexAIRagHelper:
         # Generate content using the GenerativeModel with the query and retrieval tool
         # The response will include the retrieved context from the RAG corpus
         # and the generated response based on that context.
-        response = generative_model.generate_content(
+        return generative_model.generate_content(
             query,
             tools=[rag_retrieval_tool],
             generation_config={
@@ -177,6 +513,10 @@ class VertexAIRagHelper:
             }
         )
 
-        self.langfuse.flush()
-
-        return response
\ No newline at end of file
+    @staticmethod
+    def _grounding_chunks_count(response: GenerationResponse) -> int:
+        # Contextos recuperados que usó la respuesta (grounding_metadata del primer candidato)
+        if not response.candidates:
+            return 0
+        metadata = getattr(response.candidates[0], "grounding_metadata", None)
+        return len(getattr(metadata, "grounding_chunks", None) or [])
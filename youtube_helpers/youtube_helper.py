@@ -1,11 +1,27 @@
+import os
 import re
+import threading
 import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 from datetime import datetime
 from youtube_transcript_api import YouTubeTranscriptApi, FetchedTranscriptSnippet
 from llm_helpers.brawlers_data import BRAWLERS_LIST
 
 class YouTubeHelper:
+    # Orden de preferencia de idiomas del transcript (los creadores suelen ser ES / PT)
+    transcript_languages = [
+        lang.strip() for lang in os.getenv("TRANSCRIPT_LANGUAGES", "es,pt,en").split(",") if lang.strip()
+    ]
+    fetch_workers = int(os.getenv("TRANSCRIPT_FETCH_WORKERS", "4"))
+    cache_size = int(os.getenv("TRANSCRIPT_CACHE_SIZE", "128"))
+
+    # Caché LRU por proceso: video_id -> (texto, snippets, idioma) y tracks que ya fallaron
+    _cache_lock = threading.Lock()
+    _transcript_cache: OrderedDict = OrderedDict()
+    _failed_tracks: dict[str, set] = {}
+
     def __init__(self, url: str):
         self.url = url
         self.video_id = self.extract_video_id(url)
@@ -13,6 +29,7 @@ class YouTubeHelper:
         self._soup = BeautifulSoup(self._response.text, features="html.parser")
         self._title = None
         self._publish_date = None
+        self.transcript_language = None
 
     @staticmethod
     def extract_video_id(url: str) -> str:
@@ -41,10 +58,73 @@ class YouTubeHelper:
         return ""
 
     def get_transcript(self) -> tuple[str, list[FetchedTranscriptSnippet]]:
-        transcript = YouTubeTranscriptApi().fetch(self.video_id)
+        """
+        Fetch the best available transcript track.
+
+        Tracks are listed once and ranked manual before auto-generated, then
+        by TRANSCRIPT_LANGUAGES (other languages only as a last resort). The
+        best track is fetched first; if it fails, the remaining candidates are
+        fetched concurrently and the best ranked success is used. Results and
+        failed tracks are cached per video_id, so retries don't repeat one
+        failed round trip per language.
+        """
+        with self._cache_lock:
+            cached = self._transcript_cache.get(self.video_id)
+            if cached is not None:
+                self._transcript_cache.move_to_end(self.video_id)
+        if cached is not None:
+            text, snippets, self.transcript_language = cached
+            return text, snippets
+
+        with self._cache_lock:
+            failed = set(self._failed_tracks.get(self.video_id, set()))
+        ranked = self._rank_tracks(YouTubeTranscriptApi().list(self.video_id))
+        # Si ya fallaron todos, se reintentan todos (el error pudo ser transitorio)
+        candidates = [t for t in ranked if self._track_key(t) not in failed] or ranked
+        if not candidates:
+            raise ValueError(f"No hay transcripts disponibles para {self.video_id}")
+
+        fetched = self._fetch_track(candidates[0])
+        if fetched is None and len(candidates) > 1:
+            with ThreadPoolExecutor(max_workers=self.fetch_workers) as executor:
+                results = list(executor.map(self._fetch_track, candidates[1:]))
+            # El primero que no falló respeta el orden de preferencia
+            fetched = next((r for r in results if r is not None), None)
+        if fetched is None:
+            raise ValueError(f"No se pudo obtener ningún transcript para {self.video_id}")
+
+        track, transcript = fetched
         text = " ".join(snippet.text for snippet in transcript.snippets)
+        self.transcript_language = track.language_code
+        with self._cache_lock:
+            self._transcript_cache[self.video_id] = (text, transcript.snippets, track.language_code)
+            self._failed_tracks.pop(self.video_id, None)
+            while len(self._transcript_cache) > self.cache_size:
+                self._transcript_cache.popitem(last=False)
         return text, transcript.snippets
 
+    def _rank_tracks(self, transcript_list) -> list:
+        langs = self.transcript_languages
+
+        # Idiomas fuera de TRANSCRIPT_LANGUAGES quedan al final como último recurso
+        def rank(track):
+            lang = track.language_code.split("-")[0]
+            return (lang not in langs, track.is_generated, langs.index(lang) if lang in langs else 0)
+
+        return sorted(transcript_list, key=rank)
+
+    @staticmethod
+    def _track_key(track) -> str:
+        return f"{track.language_code}:{'generated' if track.is_generated else 'manual'}"
+
+    def _fetch_track(self, track):
+        try:
+            return track, track.fetch()
+        except Exception:
+            with self._cache_lock:
+                self._failed_tracks.setdefault(self.video_id, set()).add(self._track_key(track))
+            return None
+
     def extract_all(self) -> dict:
         """Devuelve un diccionario con título, fecha y transcript."""
         title = self.get_title()
@@ -55,4 +135,5 @@ class YouTubeHelper:
             "publish_date": publish_date,
             "transcript_text": transcript_text,
             "transcript_snippets": transcript_snippets,
+            "transcript_language": self.transcript_language,
         }
\ No newline at end of file